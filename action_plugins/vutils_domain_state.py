@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2017, Koaps
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.plugins.loader import action_loader
+
+VutilsSquash = action_loader.get('vutils_squash', class_only=True)
+
+
+class ActionModule(VutilsSquash):
+    pass
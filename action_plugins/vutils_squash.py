@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2017, Koaps
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Squash looped vutils tasks into one vutils_batch module run per host.
+
+Ansible runs a module once per loop item, which for a few hundred items is
+mostly SSH and interpreter startup. The first item of a looped task works
+out the whole item list, templates the module options for every item and
+sends them to the target as a single vutils_batch call; that item and the
+ones after it then return their own record from the batch result without
+running anything on the target. Tasks without a loop, with until/retries,
+with a delegate_to, environment or vars that differ per item, or whose items
+cannot be worked out on the controller run the module normally. Squashed
+items do not use the result cache, vutils_batch results are not cached.
+
+The per-module action plugins are ActionModule under the module's name;
+vutils_batch fills in each operation's defaults on the target.
+"""
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+
+from ansible.errors import AnsibleError
+from ansible.parsing.mod_args import ModuleArgsParser
+from ansible.plugins.action import ActionBase
+from ansible.plugins.loader import lookup_loader
+from ansible.utils.listify import listify_lookup_plugin_terms
+
+try:
+    from ansible.vars.clean import remove_omit
+except ImportError:
+    # ansible < 2.8 drops omitted top level options only
+    def remove_omit(task_args, omit_token):
+        return dict((k, v) for k, v in task_args.items() if v != omit_token)
+
+COMMON_OPTIONS = ('debug', 'metrics', 'profile', 'timing', 'uri')
+
+# vutils_batch results are not cached, so the squashed operations always run
+UNBATCHED_OPTIONS = ('cache', 'cache_ttl')
+
+# task keywords that decide where and how an item runs; the batch runs once,
+# on the first item's connection, so they must be the same for every item
+ITEM_KEYWORDS = ('delegate_to', 'environment', 'vars')
+
+# (task uuid, host) -> items left to run and options key -> batch records, in loop order
+_results = {}
+
+
+def _key(args):
+    return json.dumps(args, sort_keys=True, default=str)
+
+
+class ActionModule(ActionBase):
+
+    def run(self, tmp=None, task_vars=None):
+        if task_vars is None:
+            task_vars = dict()
+        result = super(ActionModule, self).run(tmp, task_vars)
+        result.update(self._squashed(task_vars) or self._execute_module(task_vars=task_vars))
+        return result
+
+    def _cmd(self):
+        return self._task.action[len('vutils_'):]
+
+    def _loop_var(self):
+        loop_control = self._task.loop_control
+        return (loop_control and loop_control.loop_var) or 'item'
+
+    def _squashed(self, task_vars):
+        """Return this item's record from the batch, running the batch on the first item."""
+        if not self._task.loop or self._task.until or self._loop_var() not in task_vars:
+            return None
+        keyword = self._per_item_keywords()
+        if keyword is not None:
+            self._display.vvv('vutils: not squashing loop: {} depends on the loop item'.format(keyword))
+            return None
+        slot = (self._task._uuid, task_vars.get('inventory_hostname'))
+        if slot not in _results:
+            try:
+                item_args = self._item_args(task_vars)
+            except AnsibleError as e:
+                self._display.vvv('vutils: not squashing loop: {}'.format(e))
+                return None
+            # run() is called once per item whose when holds, the last one drops the slot
+            _results[slot] = dict(left=len(item_args), pending={})
+            try:
+                _results[slot]['pending'] = self._run_batch(item_args, task_vars)
+            except AnsibleError as e:
+                self._display.vvv('vutils: not squashing loop: {}'.format(e))
+        state = _results[slot]
+        state['left'] -= 1
+        if state['left'] <= 0:
+            del _results[slot]
+        records = state['pending'].get(_key(self._options(self._task.args)))
+        if not records:
+            return None
+        record = records.pop(0)
+        if record.get('success'):
+            return dict(changed=record['changed'], success=True, content=record['content'])
+        return dict(changed=record.get('changed', False), failed=True,
+                    msg=record.get('error') or record.get('content'))
+
+    def _per_item_keywords(self):
+        # a keyword mentioning the loop or index variable may differ per item
+        loop_control = self._task.loop_control
+        names = [ self._loop_var(), loop_control and loop_control.index_var ]
+        ds    = self._task._ds if isinstance(self._task._ds, dict) else {}
+        for keyword in ITEM_KEYWORDS:
+            value = json.dumps(ds.get(keyword), default=str)
+            if any(name and name in value for name in names):
+                return keyword
+        return None
+
+    def _options(self, args):
+        return dict((k, v) for k, v in args.items() if v is not None and k not in UNBATCHED_OPTIONS)
+
+    def _loop_items(self, task_vars):
+        loop = self._task.loop
+        if self._task.loop_with:
+            lookup = lookup_loader.get(self._task.loop_with, loader=self._loader, templar=self._templar)
+            if lookup is None:
+                raise AnsibleError('lookup {} not found'.format(self._task.loop_with))
+            terms = listify_lookup_plugin_terms(loop, templar=self._templar, loader=self._loader,
+                                                fail_on_undefined=True, convert_bare=False)
+            return lookup.run(terms=terms, variables=task_vars, wantlist=True)
+        items = self._templar.template(loop)
+        if not isinstance(items, list):
+            raise AnsibleError('loop is not a list: {!r}'.format(items))
+        return items
+
+    def _item_args(self, task_vars):
+        """Template the task's raw module options once per loop item whose when holds.
+
+        Omitted options are dropped the way TaskExecutor drops them from the
+        task args, so the records match the args each item runs with.
+        """
+        action, raw_args, _ = ModuleArgsParser(task_ds=self._task._ds).parse()
+        omit_token   = task_vars.get('omit')
+        loop_control = self._task.loop_control
+        index_var    = loop_control and loop_control.index_var
+        item_args    = []
+        try:
+            for index, item in enumerate(self._loop_items(task_vars)):
+                item_vars = dict(task_vars)
+                item_vars[self._loop_var()] = item
+                if index_var:
+                    item_vars[index_var] = index
+                self._templar.set_available_variables(item_vars)
+                if self._task.when and not self._task.evaluate_conditional(self._templar, item_vars):
+                    continue
+                args = self._templar.template(raw_args)
+                if omit_token is not None:
+                    args = remove_omit(args, omit_token)
+                item_args.append(args)
+        finally:
+            self._templar.set_available_variables(task_vars)
+        return item_args
+
+    def _run_batch(self, item_args, task_vars):
+        """Run one vutils_batch per distinct set of common options and index the records."""
+        groups = {}
+        for args in item_args:
+            common = dict((k, args[k]) for k in COMMON_OPTIONS if args.get(k) is not None)
+            data   = dict((k, v) for k, v in args.items() if k not in COMMON_OPTIONS)
+            groups.setdefault(_key(common), (common, []))[1].append(self._options(data))
+
+        pending = {}
+        for common, ops in groups.values():
+            module_args = dict(common, stop_on_error=False,
+                               operations=[dict(cmd=self._cmd(), data=data) for data in ops])
+            res = self._execute_module(module_name='vutils_batch', module_args=module_args, task_vars=task_vars)
+            records = res.get('content') if not res.get('failed') else res.get('msg')
+            if not isinstance(records, list) or len(records) != len(ops):
+                raise AnsibleError('vutils_batch failed: {}'.format(res.get('msg')))
+            for data, record in zip(ops, records):
+                pending.setdefault(_key(dict(data, **common)), []).append(record)
+        return pending
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2017, Koaps
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Benchmark the VirtUtils commands against libvirt's test:/// driver.
+
+For every host size a test driver node file is generated with that many
+domains (each with --interfaces NICs) and vols, and every command in the
+cmd_call table is run --iterations times over one connection, except
+domain_wait on the test driver, whose event connection reloads the node
+file every run and would measure that instead. With
+--backend fake the host is generated in memory by virt_fake instead, which
+needs no libvirt at all and scales to 100k domains; --latency adds a delay
+to every fake libvirt call. Latency percentiles, libvirt RPC counts and the
+per-phase split reported by the ``timing`` option are written as JSON;
+--compare prints the p50 change against an earlier result file.
+
+    python bench/vutils_bench.py --sizes 10,1000,20000 --output bench.json
+    python bench/vutils_bench.py --sizes 10,1000 --compare bench.json
+    python bench/vutils_bench.py --backend fake --sizes 100000 --latency 0.0002
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import collections
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils'))
+
+import virt_utils
+
+NETWORK = 'br0_net'
+POOL    = 'zfspool'
+
+def mac_address(n, nic):
+    return '52:54:%02x:%02x:%02x:%02x' % (nic, (n >> 16) & 0xff, (n >> 8) & 0xff, n & 0xff)
+
+
+def domain_xml(name, n, interfaces):
+    nics = ''.join(
+        "<interface type='network'><mac address='%s'/><source network='%s'/><model type='virtio'/></interface>"
+        % (mac_address(n, i), NETWORK if i == 0 else 'net%d' % i) for i in range(interfaces))
+    return ("<domain type='test'><name>%s</name><memory>1048576</memory><vcpu>1</vcpu>"
+            "<os><type>hvm</type></os><devices>%s</devices></domain>" % (name, nics))
+
+
+def volume_xml(name):
+    return "<volume><name>%s</name><capacity>1073741824</capacity></volume>" % name
+
+
+def node_xml(domains, interfaces, volumes):
+    parts = ['<node>']
+    for n in range(domains):
+        parts.append(domain_xml('bench-%d' % n, n, interfaces))
+    parts.append("<pool type='dir'><name>%s</name><target><path>/bench-pool</path></target>" % POOL)
+    for n in range(volumes):
+        parts.append(volume_xml('vol-%d' % n))
+    parts.append('</pool></node>')
+    return ''.join(parts)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    def pct(p):
+        return samples[min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))]
+    return { 'min' : samples[0],
+             'p50' : pct(50),
+             'p90' : pct(90),
+             'p99' : pct(99),
+             'max' : samples[-1],
+             'mean': sum(samples) / len(samples) }
+
+
+class Bench(object):
+
+    def __init__(self, uri, iterations, workdir):
+        self.iterations = iterations
+        self.uri        = uri
+        self.workdir    = workdir
+        self.results    = {}
+        self.conn       = virt_utils.open_connection(uri)
+
+    def call(self, cmd, data):
+        result = virt_utils.VirtUtils(cmd, data, conn=self.conn, uri=self.uri, timing=True).cmd_call()()
+        if not result['success']:
+            raise Exception('{} failed: {}'.format(cmd, result['content']))
+        return result
+
+    def measure(self, label, cmd, data_fn, iterations=None):
+        samples = []
+        rpcs    = collections.Counter()
+        phases  = collections.Counter()
+        iterations = iterations or self.iterations
+        for i in range(iterations):
+            data = data_fn(i)
+            t0 = time.time()
+            timing = self.call(cmd, data)['timing']
+            samples.append(time.time() - t0)
+            rpcs.update(timing['rpcs'])
+            phases.update(timing['phases'])
+        self._record(label, samples, rpcs, phases)
+
+    def _record(self, label, samples, rpcs, phases):
+        self.results[label] = { 'latency'      : percentiles(samples),
+                                'iterations'   : len(samples),
+                                'rpcs_per_op'  : sum(rpcs.values()) / len(samples),
+                                'rpcs'         : dict(rpcs),
+                                'phases'       : dict((name, sec / len(samples)) for name, sec in phases.items()) }
+
+    def measure_pair(self, create_label, create_cmd, create_fn, delete_label, delete_cmd, delete_fn):
+        samples = { create_label: [], delete_label: [] }
+        rpcs    = { create_label: collections.Counter(), delete_label: collections.Counter() }
+        phases  = { create_label: collections.Counter(), delete_label: collections.Counter() }
+        for i in range(self.iterations):
+            for label, cmd, data_fn in ((create_label, create_cmd, create_fn), (delete_label, delete_cmd, delete_fn)):
+                t0 = time.time()
+                timing = self.call(cmd, data_fn(i))['timing']
+                samples[label].append(time.time() - t0)
+                rpcs[label].update(timing['rpcs'])
+                phases[label].update(timing['phases'])
+        for label in (create_label, delete_label):
+            self._record(label, samples[label], rpcs[label], phases[label])
+
+
+def run_size(domains, interfaces, volumes, iterations, backend='test', latency=0):
+    workdir = tempfile.mkdtemp(prefix='vutils-bench-')
+    try:
+        t0 = time.time()
+        if backend == 'fake':
+            uri    = 'fake:///bench-%d?domains=%d&interfaces=%d&volumes=%d&pool=%s&network=%s&latency=%s' % (
+                     domains, domains, interfaces, volumes, POOL, NETWORK, latency)
+            prefix = 'vm-%d'
+        else:
+            uri    = 'test://' + os.path.join(workdir, 'node.xml')
+            prefix = 'bench-%d'
+            with open(uri[len('test://'):], 'w') as f:
+                f.write(node_xml(domains, interfaces, volumes))
+        bench = Bench(uri, iterations, workdir)
+        setup = time.time() - t0
+
+        last       = domains - 1
+        name       = prefix % last
+        mac        = mac_address(last, 0)
+        vol        = 'vol-%d' % (volumes - 1)
+        vols       = ['vol-%d' % n for n in range(min(volumes, 100))]
+        index_path = os.path.join(workdir, 'mac_index.json')
+
+        bench.measure('domain_find',       'domain_find',  lambda i: { 'mac': mac, 'network': NETWORK, 'index_path': index_path })
+        bench.measure('domain_find_scan',  'domain_find',  lambda i: { 'mac': mac, 'network': NETWORK, 'index': False })
+        bench.measure('domain_get',        'domain_get',   lambda i: { 'name': name, 'network': NETWORK })
+        bench.measure('domain_state',      'domain_state', lambda i: { 'name': name })
+        bench.measure('domain_state_all',  'domain_state', lambda i: { 'all': True })
+        if backend != 'test':
+            bench.measure('domain_wait',   'domain_wait',  lambda i: { 'name': name, 'state': 'running', 'timeout': 5 })
+        bench.measure('inventory',         'inventory',    lambda i: { 'state_dir': os.path.join(workdir, 'inventory') })
+        if volumes:
+            bench.measure('storage_get',       'storage_get', lambda i: { 'name': vol, 'pool': POOL })
+            bench.measure('storage_get_batch', 'storage_get', lambda i: { 'names': vols, 'pool': POOL })
+        operations = [ { 'cmd': 'domain_state', 'data': { 'name': name } },
+                       { 'cmd': 'domain_get', 'data': { 'name': name, 'network': NETWORK } } ]
+        if volumes:
+            operations.append({ 'cmd': 'storage_get', 'data': { 'name': vol, 'pool': POOL } })
+        bench.measure('batch',             'batch',        lambda i: { 'operations': operations })
+        bench.measure_pair('domain_create', 'domain_create', lambda i: { 'xmlconfig': domain_xml('bench-new-%d' % i, domains + i, interfaces) },
+                           'domain_delete', 'domain_delete', lambda i: { 'name': 'bench-new-%d' % i })
+        bench.measure_pair('storage_create', 'storage_create', lambda i: { 'pool': POOL, 'xmlconfig': volume_xml('vol-new-%d' % i) },
+                           'storage_delete', 'storage_delete', lambda i: { 'pool': POOL, 'name': 'vol-new-%d' % i })
+        return { 'backend': backend, 'domains': domains, 'interfaces': interfaces, 'volumes': volumes,
+                 'setup_seconds': setup, 'commands': bench.results }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                      stderr=subprocess.STDOUT)
+        return out.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    old_runs = dict((run['domains'], run) for run in old['runs'])
+    for run in new['runs']:
+        prev = old_runs.get(run['domains'])
+        if prev is None:
+            continue
+        for label in sorted(run['commands']):
+            if label not in prev['commands']:
+                continue
+            a = prev['commands'][label]['latency']['p50']
+            b = run['commands'][label]['latency']['p50']
+            print('%7d  %-18s p50 %9.3fms -> %9.3fms  %+7.1f%%' % (
+                run['domains'], label, a * 1000, b * 1000, (b - a) / a * 100 if a else 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark VirtUtils against the libvirt test driver')
+    parser.add_argument('--sizes', default='10,100,1000', help='comma separated domain counts per synthetic host')
+    parser.add_argument('--interfaces', type=int, default=2, help='interfaces per domain')
+    parser.add_argument('--volumes', type=int, default=None, help='vols in the pool (default: one per domain)')
+    parser.add_argument('--iterations', type=int, default=20, help='runs per command')
+    parser.add_argument('--backend', choices=('test', 'fake'), default='test',
+                        help="libvirt's test:/// driver or the in-memory virt_fake backend")
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every fake libvirt call')
+    parser.add_argument('--output', default=None, help='write results to this JSON file')
+    parser.add_argument('--compare', default=None, help='print p50 changes against this earlier JSON result')
+    args = parser.parse_args(argv)
+
+    report = { 'commit'    : git_commit(),
+               'timestamp' : time.time(),
+               'python'    : platform.python_version(),
+               'libvirt'   : virt_utils.libvirt.getVersion(),
+               'iterations': args.iterations,
+               'runs'      : [] }
+    for size in [int(s) for s in args.sizes.split(',')]:
+        volumes = size if args.volumes is None else args.volumes
+        run = run_size(size, args.interfaces, volumes, args.iterations, args.backend, args.latency)
+        report['runs'].append(run)
+        for label in sorted(run['commands']):
+            stats = run['commands'][label]
+            print('%7d  %-18s p50 %9.3fms  p99 %9.3fms  rpcs/op %8.1f' % (
+                size, label, stats['latency']['p50'] * 1000, stats['latency']['p99'] * 1000, stats['rpcs_per_op']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2017, Koaps
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+
+class ModuleDocFragment(object):
+
+    # Options every vutils module takes, from VUTILS_CMD.argspec
+    DOCUMENTATION = '''
+options:
+    debug:
+        default: false
+        description:
+            - Turn on module debugging output
+        required: false
+        type: bool
+    metrics:
+        description:
+            - Record the command latency, result and scanned domain and volume counts in this node_exporter textfile collector file (for example C(/var/lib/node_exporter/textfile_collector/vutils.prom)); defaults to C(VUTILS_METRICS) from the environment, unset disables metrics
+        required: false
+        type: path
+    profile:
+        description:
+            - Run the command under cProfile on the target and write the profile to this directory as C(<command>-<timestamp>-<pid>.prof); defaults to C(VUTILS_PROFILE) from the environment. Profiled runs bypass vutilsd
+        required: false
+        type: path
+    timing:
+        default: false
+        description:
+            - Return seconds spent per phase (connect, listing, xml_fetch, xml_parse, lookup, result) and libvirt RPC counts under the timing key
+        required: false
+        type: bool
+    uri:
+        default: qemu:///system
+        description:
+            - libvirt connection URI of the hypervisor
+        required: false
+'''
+
+    # The result cache, for domain_find, domain_get, domain_state and storage_get
+    QUERY = '''
+options:
+    cache:
+        description:
+            - Serve this query's result from this directory on the target while it is fresh, and keep successful results there; defaults to C(VUTILS_CACHE) from the environment, unset disables the cache
+            - Changes made through vutils drop the results they make stale, changes made outside it are only seen once the result expires
+            - Runs with C(uris) and looped tasks squashed into C(vutils_batch) are not cached
+        required: false
+        type: path
+    cache_ttl:
+        description:
+            - Seconds a cached result may be served for, instead of the per-command default (300 for domain_find, 60 for domain_get and storage_get, 10 for domain_state); 0 always runs the command
+        required: false
+        type: float
+'''
+
+    # The result cache, for the modules that change the hypervisor
+    CHANGE = '''
+options:
+    cache:
+        description:
+            - A result cache directory on the target to drop the queries this change makes stale from, besides C(/var/cache/vutils/results) which is always invalidated; defaults to C(VUTILS_CACHE) from the environment
+        required: false
+        type: path
+    cache_ttl:
+        description:
+            - Not used, changes are never cached
+        required: false
+        type: float
+'''
+
+    # The result cache, for the read-only modules whose results are not cached
+    UNCACHED = '''
+options:
+    cache:
+        description:
+            - Not used, results of this module are never cached
+        required: false
+        type: path
+    cache_ttl:
+        description:
+            - Not used, results of this module are never cached
+        required: false
+        type: float
+'''
@@ -0,0 +1,655 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2017, Koaps
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""In-memory stand-in for the libvirt bindings.
+
+Implements the part of the connection, domain, storage pool and vol API
+that VirtUtils uses, against hosts held in process memory, so the scan
+logic can be load tested and profiled without libvirtd. A host is named by
+its ``fake://`` URI and lives until the process exits; the query string
+generates synthetic domains and vols on first open and sets per-call
+latency in seconds:
+
+    fake:///big?domains=100000&interfaces=2&volumes=1000&latency=0.0002&latency.XMLDesc=0.001
+
+The constants use libvirt's values, and libvirtError subclasses the real
+one when the bindings are installed, so callers handle both alike.
+"""
+
+import threading
+import time
+import uuid as uuidlib
+
+try:
+    import xml.etree.ElementTree as ET
+    ET_FOUND = True
+except ImportError:
+    ET_FOUND = False
+
+try:
+    from urlparse import parse_qsl
+except ImportError:
+    from urllib.parse import parse_qsl
+
+try:
+    import libvirt as _libvirt
+    _ErrorBase = _libvirt.libvirtError
+except ImportError:
+    _ErrorBase = Exception
+
+VIR_DOMAIN_NOSTATE                        = 0
+VIR_DOMAIN_RUNNING                        = 1
+VIR_DOMAIN_BLOCKED                        = 2
+VIR_DOMAIN_PAUSED                         = 3
+VIR_DOMAIN_SHUTDOWN                       = 4
+VIR_DOMAIN_SHUTOFF                        = 5
+VIR_DOMAIN_CRASHED                        = 6
+VIR_DOMAIN_PMSUSPENDED                    = 7
+
+VIR_DOMAIN_EVENT_ID_LIFECYCLE             = 0
+VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED        = 15
+VIR_DOMAIN_EVENT_ID_DEVICE_ADDED          = 19
+
+VIR_DOMAIN_EVENT_DEFINED                  = 0
+VIR_DOMAIN_EVENT_UNDEFINED                = 1
+VIR_DOMAIN_EVENT_STARTED                  = 2
+VIR_DOMAIN_EVENT_SUSPENDED                = 3
+VIR_DOMAIN_EVENT_RESUMED                  = 4
+VIR_DOMAIN_EVENT_STOPPED                  = 5
+VIR_DOMAIN_EVENT_SHUTDOWN                 = 6
+VIR_DOMAIN_EVENT_PMSUSPENDED              = 7
+VIR_DOMAIN_EVENT_CRASHED                  = 8
+
+VIR_DOMAIN_STATS_STATE                    = 1
+VIR_DOMAIN_STATS_BALLOON                  = 4
+VIR_DOMAIN_STATS_VCPU                     = 8
+
+VIR_CONNECT_LIST_DOMAINS_ACTIVE           = 1
+VIR_CONNECT_LIST_DOMAINS_INACTIVE         = 2
+VIR_CONNECT_LIST_STORAGE_POOLS_INACTIVE   = 1
+VIR_CONNECT_LIST_STORAGE_POOLS_ACTIVE     = 2
+
+VIR_DOMAIN_UNDEFINE_MANAGED_SAVE          = 1
+VIR_DOMAIN_UNDEFINE_SNAPSHOTS_METADATA    = 2
+VIR_DOMAIN_UNDEFINE_NVRAM                 = 4
+
+VIR_STORAGE_VOL_CREATE_REFLINK            = 2
+
+VIR_ERR_INTERNAL_ERROR                    = 1
+VIR_ERR_XML_ERROR                         = 27
+VIR_ERR_OPERATION_DENIED                  = 29
+VIR_ERR_NO_DOMAIN                         = 42
+VIR_ERR_NO_STORAGE_POOL                   = 49
+VIR_ERR_NO_STORAGE_VOL                    = 50
+VIR_ERR_OPERATION_INVALID                 = 55
+VIR_ERR_STORAGE_VOL_EXIST                 = 90
+
+# calls answered without a round trip, never delayed
+LOCAL_CALLS = ( 'name', 'UUIDString', 'ID', 'key', 'connect', 'getURI', 'isAlive', 'close' )
+
+
+class libvirtError(_ErrorBase):
+
+    def __init__(self, msg, code=VIR_ERR_INTERNAL_ERROR):
+        Exception.__init__(self, msg)
+        self.err = ( code, 0, msg, 2, None, None, None, 0, 0 )
+
+    def get_error_code(self):
+        return self.err[0]
+
+    def get_error_message(self):
+        return self.err[2]
+
+
+def mac_address(n, nic):
+    return '52:54:%02x:%02x:%02x:%02x' % (nic, (n >> 16) & 0xff, (n >> 8) & 0xff, n & 0xff)
+
+def domain_xml(name, n, interfaces=2, network='br0_net', metadata=0, uuid=None):
+    """Synthetic domain XML; the first NIC is on ``network``, the rest on net1, net2..."""
+    nics = ''.join(
+      "<interface type='network'><mac address='%s'/><source network='%s'/><model type='virtio'/></interface>"
+      % (mac_address(n, i), network if i == 0 else 'net%d' % i) for i in range(interfaces))
+    meta = "<metadata><vutils:pad xmlns:vutils='urn:vutils'>%s</vutils:pad></metadata>" % ('x' * metadata) if metadata else ''
+    return ("<domain type='kvm'><name>%s</name><uuid>%s</uuid><memory unit='KiB'>1048576</memory>"
+            "<currentMemory unit='KiB'>1048576</currentMemory><vcpu>2</vcpu>%s<os><type>hvm</type></os>"
+            "<devices>%s</devices></domain>" % (name, uuid or str(uuidlib.UUID(int=n + 1)), meta, nics))
+
+def volume_xml(name, capacity=1 << 30):
+    return "<volume><name>%s</name><capacity unit='bytes'>%d</capacity></volume>" % (name, capacity)
+
+
+class _Host(object):
+    """The domains, pools and event callbacks behind one fake:// URI."""
+
+    def __init__(self, uri):
+        self.uri        = uri
+        self.domains    = {}
+        self.uuids      = {}
+        self.pools      = {}
+        self.paths      = {}
+        self.latency    = {}
+        self.delay      = 0.0
+        self.callbacks  = {}
+        self.next_id    = 1
+        self.next_cb    = 0
+        self.lock       = threading.RLock()
+
+    def wait(self, call):
+        delay = self.latency.get(call, self.delay)
+        if delay:
+          time.sleep(delay)
+
+    def add_domain(self, rec):
+        with self.lock:
+          self.domains[rec.name] = rec
+          self.uuids[rec.uuid]   = rec
+
+    def drop_domain(self, rec):
+        with self.lock:
+          if self.domains.get(rec.name) is rec:
+            del self.domains[rec.name]
+            del self.uuids[rec.uuid]
+
+    def add_vol(self, pool, name, capacity):
+        with self.lock:
+          if name in pool.vols:
+            raise libvirtError("storage volume '{}' exists already".format(name), VIR_ERR_STORAGE_VOL_EXIST)
+          rec = pool.vols[name] = _Vol(pool, name, capacity)
+          self.paths[rec.path] = rec
+          return rec
+
+    def drop_vol(self, rec):
+        with self.lock:
+          if rec.pool.vols.get(rec.name) is rec:
+            del rec.pool.vols[rec.name]
+            del self.paths[rec.path]
+
+    def fire(self, dom, event, detail=0):
+        # delivered on the calling thread, outside the host lock
+        with self.lock:
+          callbacks = list(self.callbacks.values())
+        for conn, eid, cb, opaque in callbacks:
+          if eid == VIR_DOMAIN_EVENT_ID_LIFECYCLE:
+            cb(conn, dom, event, detail, opaque)
+
+
+_hosts      = {}
+_hosts_lock = threading.Lock()
+
+def _host(uri):
+    query = (uri or 'fake:///default').partition('?')[2]
+    with _hosts_lock:
+      host = _hosts.get(uri)
+      if host is None:
+        host = _hosts[uri] = _Host(uri)
+        params = dict(parse_qsl(query))
+        for key, value in params.items():
+          if key == 'latency':
+            host.delay = float(value)
+          elif key.startswith('latency.'):
+            host.latency[key[len('latency.'):]] = float(value)
+        _generate(host,
+                  domains    = int(params.get('domains', 0)),
+                  interfaces = int(params.get('interfaces', 2)),
+                  volumes    = int(params.get('volumes', 0)),
+                  pool       = params.get('pool', 'default'),
+                  network    = params.get('network', 'br0_net'),
+                  metadata   = int(params.get('metadata', 0)))
+    return host
+
+def _generate(host, domains=0, interfaces=2, volumes=0, pool='default', network='br0_net', metadata=0):
+    pool_rec = host.pools.get(pool)
+    if pool_rec is None:
+      pool_rec = host.pools[pool] = _Pool(pool)
+    for n in range(len(host.domains), len(host.domains) + domains):
+      rec       = _Domain('vm-%d' % n, str(uuidlib.UUID(int=n + 1)))
+      rec.lazy  = (n, interfaces, network, metadata)
+      rec.state = VIR_DOMAIN_RUNNING
+      rec.id    = host.next_id
+      host.next_id += 1
+      host.add_domain(rec)
+    for n in range(len(pool_rec.vols), len(pool_rec.vols) + volumes):
+      host.add_vol(pool_rec, 'vol-%d' % n, 1 << 30)
+
+def generate(uri, domains=0, interfaces=2, volumes=0, pool='default', network='br0_net', metadata=0):
+    """Adds synthetic domains (vm-N, running) and vols (vol-N) to the host at ``uri``.
+
+    :param domains: Number of domains to add.
+    :type domains: ``int``
+    :param interfaces: NICs per domain; the first is on ``network``.
+    :type interfaces: ``int``
+    :param volumes: Number of 1 GiB vols to add to ``pool``.
+    :type volumes: ``int``
+    :param metadata: Bytes of padding in each domain's metadata element.
+    :type metadata: ``int``
+    """
+    host = _host(uri)
+    with host.lock:
+      _generate(host, domains, interfaces, volumes, pool, network, metadata)
+
+def set_latency(uri, delay=None, **calls):
+    """Sets the default per-call latency of ``uri`` and overrides per API call."""
+    host = _host(uri)
+    if delay is not None:
+      host.delay = delay
+    host.latency.update(calls)
+
+def reset(uri=None):
+    """Forgets the host at ``uri``, or every host."""
+    with _hosts_lock:
+      if uri is None:
+        _hosts.clear()
+      else:
+        _hosts.pop(uri, None)
+
+
+class _Domain(object):
+    """The state of one domain, shared by every virDomain handle on it."""
+
+    __slots__ = ( 'name', 'uuid', 'xml', 'lazy', 'state', 'id' )
+
+    def __init__(self, name=None, uuid=None, xml=None):
+        self.xml   = None
+        self.lazy  = None
+        self.state = VIR_DOMAIN_SHUTOFF
+        self.id    = -1
+        self.name  = name
+        self.uuid  = uuid
+        if xml is not None:
+          self.set_xml(xml)
+
+    def set_xml(self, xml):
+        try:
+          tree = ET.fromstring(xml)
+        except Exception as e:
+          raise libvirtError('XML error: {}'.format(e), VIR_ERR_XML_ERROR)
+        name = tree.findtext('name')
+        if not name:
+          raise libvirtError('XML error: missing domain name', VIR_ERR_XML_ERROR)
+        uuid = tree.findtext('uuid')
+        if uuid is None:
+          uuid = self.uuid or str(uuidlib.uuid4())
+          ET.SubElement(tree, 'uuid').text = uuid
+        self.name = name
+        self.uuid = uuid
+        self.lazy = None
+        xml = ET.tostring(tree)
+        self.xml  = xml if isinstance(xml, str) else xml.decode('utf-8')
+
+
+class virDomain(object):
+
+    def __init__(self, host, rec, readonly=False):
+        self._host     = host
+        self._rec      = rec
+        self._readonly = readonly
+
+    def _writable(self):
+        if self._readonly:
+          raise libvirtError('operation forbidden: read only access prevents this', VIR_ERR_OPERATION_DENIED)
+
+    def name(self):
+        return self._rec.name
+
+    def UUIDString(self):
+        return self._rec.uuid
+
+    def ID(self):
+        return self._rec.id
+
+    def XMLDesc(self, flags=0):
+        self._host.wait('XMLDesc')
+        rec = self._rec
+        if rec.xml is None and rec.lazy is not None:
+          n, interfaces, network, metadata = rec.lazy
+          return domain_xml(rec.name, n, interfaces, network, metadata, rec.uuid)
+        return rec.xml
+
+    def info(self):
+        self._host.wait('info')
+        return [ self._rec.state, 1048576, 1048576, 2, 0 ]
+
+    def state(self, flags=0):
+        self._host.wait('state')
+        return [ self._rec.state, 1 ]
+
+    def isActive(self):
+        self._host.wait('isActive')
+        return int(self._rec.state != VIR_DOMAIN_SHUTOFF)
+
+    def _set_state(self, state, event, detail=0):
+        with self._host.lock:
+          self._rec.state = state
+          if state == VIR_DOMAIN_SHUTOFF:
+            self._rec.id = -1
+          elif self._rec.id == -1:
+            self._rec.id = self._host.next_id
+            self._host.next_id += 1
+        self._host.fire(self, event, detail)
+
+    def create(self):
+        self._writable()
+        self._host.wait('create')
+        if self._rec.state != VIR_DOMAIN_SHUTOFF:
+          raise libvirtError('Requested operation is not valid: domain is already running', VIR_ERR_OPERATION_INVALID)
+        self._set_state(VIR_DOMAIN_RUNNING, VIR_DOMAIN_EVENT_STARTED)
+        return 0
+
+    def destroy(self):
+        self._writable()
+        self._host.wait('destroy')
+        if self._rec.state == VIR_DOMAIN_SHUTOFF:
+          raise libvirtError('Requested operation is not valid: domain is not running', VIR_ERR_OPERATION_INVALID)
+        self._set_state(VIR_DOMAIN_SHUTOFF, VIR_DOMAIN_EVENT_STOPPED, 2)
+        return 0
+
+    def shutdown(self):
+        self._writable()
+        self._host.wait('shutdown')
+        if self._rec.state == VIR_DOMAIN_SHUTOFF:
+          raise libvirtError('Requested operation is not valid: domain is not running', VIR_ERR_OPERATION_INVALID)
+        self._host.fire(self, VIR_DOMAIN_EVENT_SHUTDOWN)
+        self._set_state(VIR_DOMAIN_SHUTOFF, VIR_DOMAIN_EVENT_STOPPED, 0)
+        return 0
+
+    def undefine(self):
+        return self.undefineFlags(0)
+
+    def undefineFlags(self, flags=0):
+        self._writable()
+        self._host.wait('undefineFlags')
+        self._host.drop_domain(self._rec)
+        self._host.fire(self, VIR_DOMAIN_EVENT_UNDEFINED)
+        return 0
+
+
+class _Pool(object):
+    """The vols of one storage pool, shared by every virStoragePool handle on it."""
+
+    def __init__(self, name):
+        self.name = name
+        self.path = '/var/lib/libvirt/images/{}'.format(name)
+        self.vols = {}
+
+
+class _Vol(object):
+
+    __slots__ = ( 'pool', 'name', 'capacity' )
+
+    def __init__(self, pool, name, capacity):
+        self.pool     = pool
+        self.name     = name
+        self.capacity = capacity
+
+    @property
+    def path(self):
+        return '{}/{}'.format(self.pool.path, self.name)
+
+
+class virStorageVol(object):
+
+    def __init__(self, host, rec, readonly=False):
+        self._host     = host
+        self._rec      = rec
+        self._readonly = readonly
+
+    def _writable(self):
+        if self._readonly:
+          raise libvirtError('operation forbidden: read only access prevents this', VIR_ERR_OPERATION_DENIED)
+
+    def name(self):
+        return self._rec.name
+
+    def key(self):
+        return self._rec.path
+
+    def path(self):
+        return self._rec.path
+
+    def info(self):
+        self._host.wait('info')
+        return [ 0, self._rec.capacity, self._rec.capacity // 2 ]
+
+    def XMLDesc(self, flags=0):
+        self._host.wait('XMLDesc')
+        rec = self._rec
+        return ("<volume type='file'><name>%s</name><key>%s</key><capacity unit='bytes'>%d</capacity>"
+                "<target><path>%s</path></target></volume>" % (rec.name, rec.path, rec.capacity, rec.path))
+
+    def delete(self, flags=0):
+        self._writable()
+        self._host.wait('delete')
+        self._host.drop_vol(self._rec)
+        return 0
+
+    def resize(self, capacity, flags=0):
+        self._writable()
+        self._host.wait('resize')
+        self._rec.capacity = capacity
+        return 0
+
+
+class virStoragePool(object):
+
+    def __init__(self, host, rec, readonly=False):
+        self._host     = host
+        self._rec      = rec
+        self._readonly = readonly
+
+    def _writable(self):
+        if self._readonly:
+          raise libvirtError('operation forbidden: read only access prevents this', VIR_ERR_OPERATION_DENIED)
+
+    def _vol(self, rec):
+        return virStorageVol(self._host, rec, self._readonly)
+
+    def name(self):
+        return self._rec.name
+
+    def isActive(self):
+        return 1
+
+    def XMLDesc(self, flags=0):
+        self._host.wait('XMLDesc')
+        return ("<pool type='dir'><name>%s</name><source/><target><path>%s</path></target></pool>"
+                % (self._rec.name, self._rec.path))
+
+    def listVolumes(self):
+        self._host.wait('listVolumes')
+        with self._host.lock:
+          return list(self._rec.vols)
+
+    def numOfVolumes(self):
+        self._host.wait('numOfVolumes')
+        with self._host.lock:
+          return len(self._rec.vols)
+
+    def listAllVolumes(self, flags=0):
+        self._host.wait('listAllVolumes')
+        with self._host.lock:
+          return [ self._vol(v) for v in self._rec.vols.values() ]
+
+    def storageVolLookupByName(self, name):
+        self._host.wait('storageVolLookupByName')
+        rec = self._rec.vols.get(name)
+        if rec is None:
+          raise libvirtError("Storage volume not found: no storage vol with matching name '{}'".format(name),
+                             VIR_ERR_NO_STORAGE_VOL)
+        return self._vol(rec)
+
+    def _vol_from_xml(self, xmlconfig):
+        try:
+          tree = ET.fromstring(xmlconfig)
+        except Exception as e:
+          raise libvirtError('XML error: {}'.format(e), VIR_ERR_XML_ERROR)
+        return tree.findtext('name'), tree.find('capacity')
+
+    def createXML(self, xmlconfig, flags=0):
+        self._writable()
+        self._host.wait('createXML')
+        name, capacity = self._vol_from_xml(xmlconfig)
+        return self._vol(self._host.add_vol(self._rec, name, int(capacity.text) if capacity is not None else 0))
+
+    def createXMLFrom(self, xmlconfig, clonevol, flags=0):
+        self._writable()
+        self._host.wait('createXMLFrom')
+        name, capacity = self._vol_from_xml(xmlconfig)
+        return self._vol(self._host.add_vol(self._rec, name, clonevol._rec.capacity))
+
+    def refresh(self, flags=0):
+        self._host.wait('refresh')
+        return 0
+
+
+class virConnect(object):
+
+    def __init__(self, uri, readonly=False):
+        self._uri      = uri
+        self._host     = _host(uri)
+        self._readonly = readonly
+        self._cbs      = set()
+        self._closed   = False
+
+    def _writable(self):
+        if self._readonly:
+          raise libvirtError('operation forbidden: read only access prevents this', VIR_ERR_OPERATION_DENIED)
+
+    def _dom(self, rec):
+        return virDomain(self._host, rec, self._readonly)
+
+    def getURI(self):
+        return self._uri
+
+    def isAlive(self):
+        return int(not self._closed)
+
+    def close(self):
+        for cb in list(self._cbs):
+          self.domainEventDeregisterAny(cb)
+        self._closed = True
+        return 0
+
+    def listAllDomains(self, flags=0):
+        self._host.wait('listAllDomains')
+        with self._host.lock:
+          doms = list(self._host.domains.values())
+        if flags & VIR_CONNECT_LIST_DOMAINS_ACTIVE:
+          doms = [ d for d in doms if d.state != VIR_DOMAIN_SHUTOFF ]
+        if flags & VIR_CONNECT_LIST_DOMAINS_INACTIVE:
+          doms = [ d for d in doms if d.state == VIR_DOMAIN_SHUTOFF ]
+        return [ self._dom(d) for d in doms ]
+
+    def lookupByName(self, name):
+        self._host.wait('lookupByName')
+        dom = self._host.domains.get(name)
+        if dom is None:
+          raise libvirtError("Domain not found: no domain with matching name '{}'".format(name), VIR_ERR_NO_DOMAIN)
+        return self._dom(dom)
+
+    def lookupByUUIDString(self, uuid):
+        self._host.wait('lookupByUUIDString')
+        dom = self._host.uuids.get(uuid)
+        if dom is None:
+          raise libvirtError("Domain not found: no domain with matching uuid '{}'".format(uuid), VIR_ERR_NO_DOMAIN)
+        return self._dom(dom)
+
+    def defineXML(self, xml):
+        self._writable()
+        self._host.wait('defineXML')
+        new = _Domain(xml=xml)
+        with self._host.lock:
+          rec = self._host.domains.get(new.name)
+          if rec is None:
+            rec = new
+            self._host.add_domain(rec)
+          else:
+            rec.set_xml(xml)
+        dom = self._dom(rec)
+        self._host.fire(dom, VIR_DOMAIN_EVENT_DEFINED)
+        return dom
+
+    def _stats(self, rec, stats):
+        record = {}
+        if not stats or stats & VIR_DOMAIN_STATS_STATE:
+          record['state.state']  = rec.state
+          record['state.reason'] = 1
+        if not stats or stats & VIR_DOMAIN_STATS_BALLOON:
+          record['balloon.current'] = 1048576
+          record['balloon.maximum'] = 1048576
+        if not stats or stats & VIR_DOMAIN_STATS_VCPU:
+          record['vcpu.current'] = 2
+          record['vcpu.maximum'] = 2
+        return record
+
+    def getAllDomainStats(self, stats=0, flags=0):
+        self._host.wait('getAllDomainStats')
+        with self._host.lock:
+          doms = list(self._host.domains.values())
+        return [ (self._dom(d), self._stats(d, stats)) for d in doms ]
+
+    def domainListGetStats(self, doms, stats=0, flags=0):
+        self._host.wait('domainListGetStats')
+        return [ (d, self._stats(d._rec, stats)) for d in doms ]
+
+    def _pool(self, rec):
+        return virStoragePool(self._host, rec, self._readonly)
+
+    def storagePoolLookupByName(self, name):
+        self._host.wait('storagePoolLookupByName')
+        pool = self._host.pools.get(name)
+        if pool is None:
+          raise libvirtError("Storage pool not found: no storage pool with matching name '{}'".format(name),
+                             VIR_ERR_NO_STORAGE_POOL)
+        return self._pool(pool)
+
+    def listAllStoragePools(self, flags=0):
+        self._host.wait('listAllStoragePools')
+        if flags & VIR_CONNECT_LIST_STORAGE_POOLS_INACTIVE:
+          return []
+        return [ self._pool(p) for p in self._host.pools.values() ]
+
+    def storageVolLookupByPath(self, path):
+        self._host.wait('storageVolLookupByPath')
+        rec = self._host.paths.get(path)
+        if rec is None:
+          raise libvirtError("Storage volume not found: no storage vol with matching path '{}'".format(path),
+                             VIR_ERR_NO_STORAGE_VOL)
+        return virStorageVol(self._host, rec, self._readonly)
+
+    def domainEventRegisterAny(self, dom, eventID, cb, opaque):
+        with self._host.lock:
+          cb_id = self._host.next_cb
+          self._host.next_cb += 1
+          self._host.callbacks[cb_id] = ( self, eventID, cb, opaque )
+        self._cbs.add(cb_id)
+        return cb_id
+
+    def domainEventDeregisterAny(self, callbackID):
+        with self._host.lock:
+          self._host.callbacks.pop(callbackID, None)
+        self._cbs.discard(callbackID)
+        return 0
+
+    def registerCloseCallback(self, cb, opaque):
+        return 0
+
+
+def open(uri=None):
+    return virConnect(uri or 'fake:///default')
+
+def openReadOnly(uri=None):
+    return virConnect(uri or 'fake:///default', readonly=True)
+
+def getVersion():
+    return 0
+
+# events are delivered synchronously, there is no loop to run
+def virEventRegisterDefaultImpl():
+    return 0
+
+def virEventRunDefaultImpl():
+    time.sleep(1)
+    return 0
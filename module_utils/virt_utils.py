@@ -10,14 +10,946 @@ try:
 except ImportError:
     ET_FOUND = False
 
+import argparse
 import collections
+import contextlib
+import errno
+import fcntl
+import hashlib
 import json
-import libvirt
+import os
+import socket
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid as uuidlib
+
+from xml.parsers import expat
+
+try:
+    import libvirt
+    LIBVIRT_FOUND = True
+except ImportError:
+    LIBVIRT_FOUND = False
+
+try:
+    from ansible.module_utils import virt_fake
+    VIRT_FAKE_FOUND = True
+except ImportError:
+    try:
+        import virt_fake
+        VIRT_FAKE_FOUND = True
+    except ImportError:
+        VIRT_FAKE_FOUND = False
+
+# without the bindings only fake:// hosts can be opened, which need the
+# constants and libvirtError from the fake backend
+if not LIBVIRT_FOUND:
+    if not VIRT_FAKE_FOUND:
+        raise ImportError('libvirt python bindings are required for this module')
+    libvirt = virt_fake
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+try:
+    import BaseHTTPServer as httpserver
+except ImportError:
+    import http.server as httpserver
+
+CHANGED_PATH        = '/var/cache/vutils/changed'
+LIBVIRT_URI         = 'qemu:///system'
+INVENTORY_STATE_DIR = '/var/cache/vutils/inventory'
+MAC_INDEX_PATH      = '/var/cache/vutils/mac_index.json'
+METRICS_PATH        = '/var/lib/node_exporter/textfile_collector/vutils.prom'
+RESULT_CACHE_DIR    = '/var/cache/vutils/results'
+SNAPSHOT_MAX_AGE    = 30
+SNAPSHOT_PATH       = '/var/cache/vutils/snapshot.json'
+FANOUT_CMDS         = ( 'domain_find', 'domain_get', 'domain_state', 'inventory', 'storage_get' )
+READONLY_CMDS       = ( 'domain_find', 'domain_get', 'domain_state', 'domain_wait', 'inventory', 'storage_get' )
+
+# seconds a cached query result is served for; domain states change on their
+# own, the MAC and volume lookups only when something is created or deleted
+CACHE_TTLS = { 'domain_find'  : 300,
+               'domain_get'   : 60,
+               'domain_state' : 10,
+               'storage_get'  : 60 }
+
+# the cached queries each change makes stale
+CACHE_INVALIDATES = { 'domain_create'  : ( 'domain_find', 'domain_get', 'domain_state' ),
+                      'domain_delete'  : ( 'domain_find', 'domain_get', 'domain_state', 'storage_get' ),
+                      'storage_create' : ( 'storage_get', ),
+                      'storage_delete' : ( 'storage_get', ) }
+
+# libvirt calls answered from the object itself, without a round trip to libvirtd
+LOCAL_CALLS = ( 'name', 'UUIDString', 'UUID', 'ID', 'key', 'connect' )
+
+# the timing phase each libvirt call is accounted to, the rest go to 'libvirt'
+LIBVIRT_PHASES = { 'listAllDomains'          : 'listing',
+                   'listAllStoragePools'     : 'listing',
+                   'listAllVolumes'          : 'listing',
+                   'listVolumes'             : 'listing',
+                   'numOfVolumes'            : 'listing',
+                   'getAllDomainStats'       : 'listing',
+                   'domainListGetStats'      : 'listing',
+                   'XMLDesc'                 : 'xml_fetch',
+                   'lookupByName'            : 'lookup',
+                   'lookupByUUIDString'      : 'lookup',
+                   'storagePoolLookupByName' : 'lookup',
+                   'storageVolLookupByName'  : 'lookup',
+                   'storageVolLookupByPath'  : 'lookup' }
+VUTILSD_SOCKET      = '/run/vutils/vutilsd.sock'
+# seconds to wait for vutilsd to accept, and for its answer on top of the command's own timeout
+VUTILSD_CONNECT_TIMEOUT = 5
+VUTILSD_READ_TIMEOUT    = 3600
+SCAN_WORKERS   = 8
+
+# the defaults and required options of each command's module, applied to the
+# operations of a batch, which do not go through a module argspec
+CMD_DEFAULTS = { 'domain_create'  : { 'concurrency': SCAN_WORKERS, 'stagger': 0 },
+                 'domain_delete'  : { 'concurrency': SCAN_WORKERS, 'graceful': True, 'remove_volumes': False,
+                                      'timeout': 60 },
+                 'domain_find'    : { 'index': True, 'index_path': MAC_INDEX_PATH, 'network': 'br0_net',
+                                      'scan_workers': SCAN_WORKERS, 'snapshot': False,
+                                      'snapshot_max_age': SNAPSHOT_MAX_AGE, 'snapshot_path': SNAPSHOT_PATH },
+                 'domain_get'     : { 'all_interfaces': False, 'network': 'br0_net' },
+                 'domain_state'   : { 'all': False },
+                 'domain_wait'    : { 'state': 'running', 'timeout': 300 },
+                 'inventory'      : { 'scan_workers': SCAN_WORKERS, 'volume_details': False },
+                 'storage_create' : { 'clone_method': 'auto', 'clone_snapshot': 'vutils-clone', 'pool': 'zfspool' },
+                 'storage_delete' : { 'pool': 'zfspool' },
+                 'storage_get'    : { 'pool': 'zfspool', 'scan_workers': SCAN_WORKERS, 'snapshot': False,
+                                      'snapshot_max_age': SNAPSHOT_MAX_AGE, 'snapshot_path': SNAPSHOT_PATH } }
+CMD_REQUIRED = { 'domain_find'    : ( 'mac', ),
+                 'domain_get'     : ( 'name', ),
+                 'storage_create' : ( 'xmlconfig', ),
+                 'storage_delete' : ( 'name', ) }
+
+DOMAIN_STATES = { libvirt.VIR_DOMAIN_RUNNING     : "running",
+                  libvirt.VIR_DOMAIN_BLOCKED     : "blocked",
+                  libvirt.VIR_DOMAIN_PAUSED      : "paused",
+                  libvirt.VIR_DOMAIN_SHUTDOWN    : "shutdown",
+                  libvirt.VIR_DOMAIN_SHUTOFF     : "shutoff",
+                  libvirt.VIR_DOMAIN_CRASHED     : "crashed",
+                  libvirt.VIR_DOMAIN_PMSUSPENDED : "pmsuspended",
+                  libvirt.VIR_DOMAIN_NOSTATE     : "nostate" }
+
+# the state a domain is in after a lifecycle event, DEFINED does not change it
+LIFECYCLE_STATES = { libvirt.VIR_DOMAIN_EVENT_UNDEFINED   : "undefined",
+                     libvirt.VIR_DOMAIN_EVENT_STARTED     : "running",
+                     libvirt.VIR_DOMAIN_EVENT_SUSPENDED   : "paused",
+                     libvirt.VIR_DOMAIN_EVENT_RESUMED     : "running",
+                     libvirt.VIR_DOMAIN_EVENT_STOPPED     : "shutoff",
+                     libvirt.VIR_DOMAIN_EVENT_SHUTDOWN    : "shutdown",
+                     libvirt.VIR_DOMAIN_EVENT_PMSUSPENDED : "pmsuspended",
+                     libvirt.VIR_DOMAIN_EVENT_CRASHED     : "crashed" }
+
+def _batch_cmd(op):
+    # operations may name the command or its module, domain_get or vutils_domain_get
+    cmd = op.get('cmd') or ''
+    return cmd[len('vutils_'):] if cmd.startswith('vutils_') else cmd
+
+def _cmd_timeout(cmd, data):
+    # seconds the command may spend waiting on domains through its timeout option
+    if cmd == 'batch':
+      return sum(_cmd_timeout(_batch_cmd(op), op.get('data') or {}) for op in data.get('operations') or [])
+    return float(data.get('timeout') or 0)
+
+def cmd_options(cmd, data):
+    """``data`` with the defaults of ``cmd``'s module filled in.
+
+    Raises an Exception naming the first required option that is missing.
+    """
+    options = dict(CMD_DEFAULTS.get(cmd, {}))
+    options.update((k, v) for k, v in data.items() if v is not None)
+    for name in CMD_REQUIRED.get(cmd, ()):
+      if options.get(name) is None:
+        raise Exception('{}: missing required option: {}'.format(cmd, name))
+    return options
+
+def is_readonly(cmd, data):
+    """True when ``cmd``, or every operation of a batch, only reads."""
+    if cmd == 'batch':
+      return all(_batch_cmd(op) in READONLY_CMDS for op in data.get('operations') or [])
+    return cmd in READONLY_CMDS
+
+def stale_cmds(cmd, data):
+    """The cached queries ``cmd``, or any operation of a batch, makes stale."""
+    if cmd == 'batch':
+      cmds = set()
+      for op in data.get('operations') or []:
+        cmds.update(CACHE_INVALIDATES.get(_batch_cmd(op), ()))
+      return sorted(cmds)
+    return list(CACHE_INVALIDATES.get(cmd, ()))
+
+def host_path(path, uri):
+    """``path`` for the state kept about ``uri``, the local hypervisor's unsuffixed."""
+    if (uri or LIBVIRT_URI) == LIBVIRT_URI:
+      return path
+    base, ext = os.path.splitext(path)
+    return '{}-{}{}'.format(base, _fingerprint(uri)[:12], ext)
+
+def mark_changed(uri, path=None):
+    """Record that ``uri`` just changed, host snapshots taken before now are stale."""
+    path = host_path(path or CHANGED_PATH, uri)
+    try:
+      os.makedirs(os.path.dirname(path))
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise
+    with open(path, 'a'):
+      os.utime(path, None)
+
+def open_connection(uri, readonly=False):
+    """Open ``uri`` on the backend that serves it.
+
+    ``fake://`` URIs, or any URI when ``VUTILS_BACKEND=fake`` is set in the
+    environment, go to the in-memory virt_fake backend; everything else to
+    the libvirt bindings.
+    """
+    if uri.startswith('fake://') or os.environ.get('VUTILS_BACKEND') == 'fake':
+      if not VIRT_FAKE_FOUND:
+        raise Exception('virt_fake backend is required for {}'.format(uri))
+      backend = virt_fake
+    elif LIBVIRT_FOUND:
+      backend = libvirt
+    else:
+      raise Exception('libvirt python bindings are required for {}'.format(uri))
+    conn = backend.openReadOnly(uri) if readonly else backend.open(uri)
+    if conn == None:
+      raise Exception('Failed to open connection to {}'.format(uri))
+    return conn
+
+def _fingerprint(xml):
+    if not isinstance(xml, bytes):
+      xml = xml.encode('utf-8')
+    return hashlib.sha1(xml).hexdigest()
+
+# one NIC of a domain, a tuple so (mac, network, model) unpacking keeps working
+Interface = collections.namedtuple('Interface', 'mac network model')
+
+class DomainRecord(object):
+    """One domain as MacIndex keeps it: ``interfaces`` holds (mac, network) pairs."""
+
+    __slots__ = ( 'uuid', 'name', 'fingerprint', 'interfaces' )
+
+    def __init__(self, uuid, name, fingerprint, interfaces):
+        self.uuid        = uuid
+        self.name        = name
+        self.fingerprint = fingerprint
+        self.interfaces  = interfaces
+
+class _DevicesDone(Exception):
+    pass
+
+def _parse_xml_interfaces(xml):
+    """Returns an Interface for each domain/devices/interface.
+
+    The XML is streamed through expat and only the attributes of interface
+    children are kept, so large metadata, cputune or disk sections cost the
+    tokenizing but never become element objects; parsing stops at the end
+    of <devices>.
+    """
+    interfaces = []
+    path       = []
+    nic        = {}
+
+    def start(tag, attrs):
+      path.append(tag)
+      depth = len(path)
+      if depth == 3:
+        if tag == 'interface' and path[1] == 'devices':
+          nic.clear()
+          nic['open'] = True
+      elif depth == 4 and nic:
+        if tag == 'mac' and 'mac' not in nic:
+          nic['mac'] = attrs.get('address')
+        elif tag == 'source' and 'network' not in nic:
+          nic['network'] = attrs.get('network')
+        elif tag == 'model' and 'model' not in nic:
+          nic['model'] = attrs.get('type')
+
+    def end(tag):
+      depth = len(path)
+      path.pop()
+      if depth == 3 and nic:
+        if nic.get('mac'):
+          interfaces.append(Interface(nic['mac'].lower(), nic.get('network'), nic.get('model')))
+        nic.clear()
+      elif depth == 2 and tag == 'devices':
+        raise _DevicesDone()
+
+    if not isinstance(xml, (bytes, str)):
+      xml = xml.encode('utf-8')
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start
+    parser.EndElementHandler   = end
+    try:
+      parser.Parse(xml, True)
+    except _DevicesDone:
+      pass
+    return interfaces
+
+def scan_map(func, items, workers=SCAN_WORKERS):
+    """Run ``func`` over ``items`` on a bounded pool of worker threads.
+
+    libvirt releases the GIL around its RPCs, so per-domain calls overlap on
+    the wire. Results are returned in the order of ``items``; the first
+    exception raised by ``func`` is re-raised after the workers stop.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+      return [func(i) for i in items]
+    results = [None] * len(items)
+    errors  = []
+    work    = queue.Queue()
+    for n, item in enumerate(items):
+      work.put((n, item))
+
+    def worker():
+      while not errors:
+        try:
+          n, item = work.get_nowait()
+        except queue.Empty:
+          return
+        try:
+          results[n] = func(item)
+        except Exception as e:
+          errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(min(workers, len(items)))]
+    for t in threads:
+      t.daemon = True
+      t.start()
+    for t in threads:
+      t.join()
+    if errors:
+      raise errors[0]
+    return results
+
+_UNITS = { 'b': 1, 'bytes': 1,
+           'k': 1024, 'kib': 1024, 'kb': 1000,
+           'm': 1024 ** 2, 'mib': 1024 ** 2, 'mb': 1000 ** 2,
+           'g': 1024 ** 3, 'gib': 1024 ** 3, 'gb': 1000 ** 3,
+           't': 1024 ** 4, 'tib': 1024 ** 4, 'tb': 1000 ** 4 }
+
+def _parse_capacity(elem):
+    if elem is None or not elem.text:
+      return None
+    return int(elem.text) * _UNITS[(elem.get('unit') or 'bytes').lower()]
+
+def _run_command(argv):
+    proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    if proc.returncode != 0:
+      raise Exception('{} failed: {}'.format(' '.join(argv), err.strip()))
+    return out
+
+class _Stagger(object):
+    """Spaces calls to ``wait`` at least ``interval`` seconds apart across threads."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next    = 0
+        self._lock    = threading.Lock()
+
+    def wait(self):
+        if self.interval <= 0:
+          return
+        with self._lock:
+          now = time.time()
+          at  = max(now, self._next)
+          self._next = at + self.interval
+        if at > now:
+          time.sleep(at - now)
+
+class _StateWaiter(object):
+    """Tracks domains until each one has reached ``target``.
+
+    Fed by lifecycle events; ``seed`` fills in the states read after the
+    callback was registered without overwriting anything an event already
+    reported.
+    """
+
+    def __init__(self, names, target):
+        self.target  = target
+        self.pending = set(names)
+        self.states  = dict((name, None) for name in names)
+        self.reached = {}
+        self.seen    = set()
+        self.t0      = time.time()
+        self._cond   = threading.Condition()
+
+    def _update(self, name, state):
+        self.states[name] = state
+        if name in self.pending and state == self.target:
+          self.pending.discard(name)
+          self.reached[name] = round(time.time() - self.t0, 3)
+          self._cond.notify_all()
+
+    def seed(self, states):
+        with self._cond:
+          for name, state in states.items():
+            if name not in self.seen:
+              self._update(name, state or 'undefined')
+
+    def on_lifecycle(self, dom, event, detail):
+        state = LIFECYCLE_STATES.get(event)
+        name  = dom.name()
+        if state is None or name not in self.states:
+          return
+        with self._cond:
+          self.seen.add(name)
+          self._update(name, state)
+
+    def wait(self, timeout):
+        deadline = time.time() + timeout
+        with self._cond:
+          while self.pending:
+            left = deadline - time.time()
+            if left <= 0:
+              break
+            self._cond.wait(left)
+        return dict((name, { 'state': self.states[name], 'reached': name in self.reached,
+                             'elapsed': self.reached.get(name) }) for name in self.states)
+
+class PhaseTimer(object):
+    """PhaseTimer.
+
+    Accumulates seconds per phase and counts libvirt RPCs per API call.
+    Phases that run on scan workers add up across threads, so their sum can
+    be larger than ``wall``.
+    """
+
+    def __init__(self):
+        self.t0     = time.time()
+        self.phases = {}
+        self.rpcs   = {}
+        self._lock  = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        t0 = time.time()
+        try:
+          yield
+        finally:
+          self.add(name, time.time() - t0)
+
+    def add(self, name, seconds):
+        with self._lock:
+          self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def rpc(self, call):
+        with self._lock:
+          self.rpcs[call] = self.rpcs.get(call, 0) + 1
+
+    def report(self):
+        with self._lock:
+          return { 'wall'      : round(time.time() - self.t0, 6),
+                   'phases'    : dict((name, round(sec, 6)) for name, sec in self.phases.items()),
+                   'rpc_calls' : sum(self.rpcs.values()),
+                   'rpcs'      : dict(self.rpcs) }
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class _NullTimer(object):
+    """Stands in for PhaseTimer when timing is off."""
+
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def add(self, name, seconds):
+        pass
+
+    def rpc(self, call):
+        pass
+
+class TimedProxy(object):
+    """Wraps a libvirt object, timing and counting the calls made through it.
+
+    Domains, pools and vols returned by a call are wrapped as well; proxies
+    handed back to libvirt are unwrapped first.
+    """
+
+    WRAP = ( libvirt.virDomain, libvirt.virStoragePool, libvirt.virStorageVol )
+    if VIRT_FAKE_FOUND:
+      WRAP += ( virt_fake.virDomain, virt_fake.virStoragePool, virt_fake.virStorageVol )
+
+    def __init__(self, obj, timer):
+        self._obj   = obj
+        self._timer = timer
+
+    def _wrap(self, value):
+        if isinstance(value, self.WRAP):
+          return TimedProxy(value, self._timer)
+        if isinstance(value, list):
+          return [ self._wrap(v) for v in value ]
+        if isinstance(value, tuple):
+          return tuple(self._wrap(v) for v in value)
+        return value
+
+    @staticmethod
+    def _unwrap(value):
+        if isinstance(value, TimedProxy):
+          return value._obj
+        if isinstance(value, list):
+          return [ TimedProxy._unwrap(v) for v in value ]
+        return value
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not callable(attr):
+          return attr
+        if name in LOCAL_CALLS:
+          return attr
+        phase = LIBVIRT_PHASES.get(name, 'libvirt')
+        def call(*args, **kwargs):
+          self._timer.rpc(name)
+          with self._timer.phase(phase):
+            value = attr(*[ self._unwrap(a) for a in args ], **kwargs)
+          return self._wrap(value)
+        return call
+
+def _write_atomic(path, data):
+    dirname = os.path.dirname(path)
+    try:
+      os.makedirs(dirname)
+    except OSError as e:
+      if e.errno != errno.EEXIST:
+        raise
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+    try:
+      with os.fdopen(fd, 'w') as f:
+        f.write(data)
+      os.rename(tmp, path)
+    except Exception:
+      os.unlink(tmp)
+      raise
+
+@contextlib.contextmanager
+def _flocked(path):
+    # serialises read-modify-write of a state file across processes
+    with open(path, 'a') as f:
+      fcntl.flock(f, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsSink(object):
+    """MetricsSink.
+
+    Prometheus metrics for VirtUtils commands: a latency histogram and result
+    counts per command and URI, plus the number of domains and volumes the
+    last scan of each URI saw.
+
+    With a path, every observation is merged into ``<path>.json`` under a
+    lock and the text exposition is rewritten atomically at ``path``, so one
+    textfile collects module runs and vutilsd alike. Without one the metrics
+    only live in memory, for ``vutilsd --metrics-port``.
+
+    :param path: node_exporter textfile collector file (``*.prom``).
+    :type path: ``str``
+    """
+
+    BUCKETS = ( 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120 )
+    RESULTS = ( 'success', 'failed', 'error' )
+
+    def __init__(self, path=METRICS_PATH):
+        self.path     = path and os.path.abspath(path)
+        self.commands = {}
+        self.objects  = {}
+        self._lock    = threading.Lock()
+
+    def _load(self):
+        try:
+          with open(self.path + '.json') as f:
+            state = json.load(f)
+        except (IOError, OSError, ValueError):
+          state = {}
+        self.commands = state.get('commands', {})
+        self.objects  = state.get('objects', {})
+
+    def _save(self):
+        _write_atomic(self.path + '.json', json.dumps({ 'commands': self.commands, 'objects': self.objects }))
+        _write_atomic(self.path, self.render())
+
+    def _record(self, cmd, uri, seconds, result, seen):
+        stats = self.commands.setdefault(uri, {}).setdefault(cmd, {
+                  'buckets' : [ 0 ] * len(self.BUCKETS),
+                  'count'   : 0,
+                  'sum'     : 0.0,
+                  'results' : dict((r, 0) for r in self.RESULTS),
+                  'last'    : 0 })
+        for i, le in enumerate(self.BUCKETS):
+          if seconds <= le:
+            stats['buckets'][i] += 1
+        stats['count'] += 1
+        stats['sum']   += seconds
+        stats['last']   = time.time()
+        stats['results'][result] += 1
+        if seen:
+          self.objects.setdefault(uri, {}).update(seen)
+
+    def observe(self, cmd, uri, seconds, result, seen=None):
+        """Record one run of ``cmd``; ``result`` is success, failed or error."""
+        with self._lock:
+          if self.path is None:
+            self._record(cmd, uri, seconds, result, seen)
+            return
+          try:
+            os.makedirs(os.path.dirname(self.path))
+          except OSError as e:
+            if e.errno != errno.EEXIST:
+              raise
+          with _flocked(self.path + '.lock'):
+            self._load()
+            self._record(cmd, uri, seconds, result, seen)
+            self._save()
+
+    def text(self):
+        """Returns the current metrics in the Prometheus text format."""
+        with self._lock:
+          if self.path is not None:
+            self._load()
+          return self.render()
+
+    def render(self):
+        lines = [ '# HELP vutils_command_duration_seconds Time taken by vutils commands.',
+                  '# TYPE vutils_command_duration_seconds histogram' ]
+        runs  = sorted((uri, cmd, stats) for uri, cmds in self.commands.items() for cmd, stats in cmds.items())
+        for uri, cmd, stats in runs:
+          labels = 'cmd="{}",uri="{}"'.format(_label(cmd), _label(uri))
+          for le, n in zip(self.BUCKETS, stats['buckets']):
+            lines.append('vutils_command_duration_seconds_bucket{%s,le="%s"} %d' % (labels, le, n))
+          lines.append('vutils_command_duration_seconds_bucket{%s,le="+Inf"} %d' % (labels, stats['count']))
+          lines.append('vutils_command_duration_seconds_sum{%s} %f' % (labels, stats['sum']))
+          lines.append('vutils_command_duration_seconds_count{%s} %d' % (labels, stats['count']))
+        lines += [ '# HELP vutils_command_results_total vutils commands by result (success, failed, error).',
+                   '# TYPE vutils_command_results_total counter' ]
+        for uri, cmd, stats in runs:
+          for result in self.RESULTS:
+            lines.append('vutils_command_results_total{cmd="%s",uri="%s",result="%s"} %d' % (
+                         _label(cmd), _label(uri), result, stats['results'][result]))
+        lines += [ '# HELP vutils_command_last_run_timestamp_seconds When each vutils command last finished.',
+                   '# TYPE vutils_command_last_run_timestamp_seconds gauge' ]
+        for uri, cmd, stats in runs:
+          lines.append('vutils_command_last_run_timestamp_seconds{cmd="%s",uri="%s"} %f' % (
+                       _label(cmd), _label(uri), stats['last']))
+        lines += [ '# HELP vutils_scan_objects Domains and volumes seen by the last scan of each hypervisor.',
+                   '# TYPE vutils_scan_objects gauge' ]
+        for uri in sorted(self.objects):
+          for kind, n in sorted(self.objects[uri].items()):
+            lines.append('vutils_scan_objects{uri="%s",kind="%s"} %d' % (_label(uri), _label(kind), n))
+        return '\n'.join(lines) + '\n'
+
+class MacIndex(object):
+    """MacIndex.
+
+    On-disk MAC -> (domain, network) index. Entries are keyed by domain UUID
+    and carry a fingerprint of the XML they were parsed from, so a refresh
+    only re-parses domains that were added or changed.
+
+    The file holds ``uuid: [name, fingerprint, [[mac, network], ...]]``
+    rows, loaded straight into DomainRecords.
+
+    :param path: The JSON file the index is kept in.
+    :type path: ``str``
+    """
+
+    VERSION = 2
+
+    def __init__(self, path=MAC_INDEX_PATH):
+        self.path    = path
+        self.domains = {}
+        self.macs    = {}
+        self.dirty   = False
+        self._load()
+
+    def _load(self):
+        try:
+          with open(self.path) as f:
+            data = json.load(f)
+        except (IOError, OSError, ValueError):
+          return
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+          return
+        macs = self.macs
+        for uuid, (name, fp, interfaces) in data.get('domains', {}).items():
+          self.domains[uuid] = DomainRecord(uuid, name, fp, interfaces)
+          for mac, network in interfaces:
+            macs.setdefault(mac, []).append((uuid, network))
+
+    def _add_macs(self, uuid, entry):
+        for mac, network in entry.interfaces:
+          self.macs.setdefault(mac, []).append((uuid, network))
+
+    def _drop_macs(self, uuid, entry):
+        for mac, network in entry.interfaces:
+          refs = [r for r in self.macs.get(mac, []) if r[0] != uuid]
+          if refs:
+            self.macs[mac] = refs
+          else:
+            self.macs.pop(mac, None)
+
+    def lookup(self, mac, network):
+        for uuid, net in self.macs.get(mac.lower(), []):
+          if net == network:
+            return uuid
+        return None
+
+    def name(self, uuid):
+        return self.domains[uuid].name
+
+    def update(self, uuid, name, xml):
+        """Re-parse ``xml`` unless its fingerprint matches the stored entry.
+
+        Returns ``True`` when the entry was added or changed.
+        """
+        fp    = _fingerprint(xml)
+        entry = self.domains.get(uuid)
+        if entry is not None and entry.fingerprint == fp and entry.name == name:
+          return False
+        if entry is not None:
+          self._drop_macs(uuid, entry)
+        interfaces = tuple((nic.mac, nic.network) for nic in _parse_xml_interfaces(xml))
+        entry = DomainRecord(uuid, name, fp, interfaces)
+        self.domains[uuid] = entry
+        self._add_macs(uuid, entry)
+        self.dirty = True
+        return True
+
+    def remove(self, uuid):
+        entry = self.domains.pop(uuid, None)
+        if entry is not None:
+          self._drop_macs(uuid, entry)
+          self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+          return
+        rows = dict((uuid, (e.name, e.fingerprint, e.interfaces)) for uuid, e in self.domains.items())
+        _write_atomic(self.path, json.dumps({ 'version': self.VERSION, 'domains': rows }))
+        self.dirty = False
+
+class InventoryStore(object):
+    """InventoryStore.
+
+    Keeps the per-domain and per-vol hashes of recent inventory runs on disk,
+    one file per generation token, so a later run can report only what
+    changed since the token it is handed.
+
+    :param path: The directory the generations are kept in.
+    :type path: ``str``
+    """
+
+    KEEP = 16
+
+    def __init__(self, path=INVENTORY_STATE_DIR):
+        self.path = path
+
+    def _file(self, token):
+        return os.path.join(self.path, token + '.json')
+
+    def load(self, token):
+        try:
+          if not token or len(token) != 32:
+            return None
+          int(token, 16)
+          with open(self._file(token)) as f:
+            return json.load(f)
+        except (IOError, OSError, ValueError):
+          return None
+
+    def save(self, snapshot):
+        token = uuidlib.uuid4().hex
+        _write_atomic(self._file(token), json.dumps(snapshot))
+        self._prune()
+        return token
+
+    def _prune(self):
+        files = []
+        for name in os.listdir(self.path):
+          if name.endswith('.json'):
+            path = os.path.join(self.path, name)
+            try:
+              files.append((os.path.getmtime(path), path))
+            except OSError:
+              continue
+        for mtime, path in sorted(files, reverse=True)[self.KEEP:]:
+          try:
+            os.unlink(path)
+          except OSError:
+            pass
+
+class HostSnapshot(object):
+    """HostSnapshot.
+
+    On-disk snapshot of part of a hypervisor, its domains (uuid, state and
+    MACs per network) or the vols of one pool, shared by every process on
+    the host.
+
+    Readers use the file as long as it is younger than ``max_age`` and was
+    taken after the last change recorded at ``changed`` by mark_changed. Once
+    it is stale, the first reader to take the lock rescans libvirt and
+    replaces the file atomically; readers queued behind it find the new file
+    when they get the lock and return that, so concurrent callers scan
+    libvirt once.
+
+    :param path: The JSON file the snapshot is kept in.
+    :type path: ``str``
+    :param max_age: Seconds a snapshot is used for before it is rescanned.
+    :type max_age: ``float``
+    :param changed: The file mark_changed touches for this hypervisor.
+    :type changed: ``str``
+    """
+
+    VERSION = 2
+
+    def __init__(self, path=SNAPSHOT_PATH, max_age=SNAPSHOT_MAX_AGE, changed=None):
+        self.path    = path
+        self.max_age = max_age
+        self.changed = changed
+
+    def _load(self):
+        try:
+          with open(self.path) as f:
+            data = json.load(f)
+        except (IOError, OSError, ValueError):
+          return None
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+          return None
+        return data
+
+    def _fresh(self, data):
+        if data is None or time.time() - data['time'] >= self.max_age:
+          return False
+        try:
+          # a scan that started before the last change may have missed it
+          return data['time'] > os.path.getmtime(self.changed)
+        except (OSError, TypeError):
+          return True
+
+    def get(self, scan):
+        """Returns the snapshot, calling ``scan`` for new contents when it is stale."""
+        data = self._load()
+        if self._fresh(data):
+          return data
+        try:
+          os.makedirs(os.path.dirname(self.path))
+        except OSError as e:
+          if e.errno != errno.EEXIST:
+            raise
+        with _flocked(self.path + '.lock'):
+          data = self._load()
+          if self._fresh(data):
+            return data
+          started = time.time()
+          data    = dict(scan(), version=self.VERSION, time=started)
+          _write_atomic(self.path, json.dumps(data))
+        return data
+
+class ResultCache(object):
+    """ResultCache.
+
+    On-disk cache of successful query results, one file per hypervisor URI
+    holding ``cmd: {args: [stored_at, result]}``. A result is served while it
+    is younger than the command's entry in CACHE_TTLS, or ``ttl`` when given;
+    commands that change the hypervisor drop the queries they make stale.
+
+    :param path: The directory the cache files are kept in.
+    :type path: ``str``
+    :param ttl: Seconds to serve results for instead of CACHE_TTLS.
+    :type ttl: ``float``
+    """
+
+    def __init__(self, path=RESULT_CACHE_DIR, ttl=None):
+        self.path = path
+        self.ttl  = ttl
+
+    def _file(self, uri):
+        return os.path.join(self.path, hashlib.sha1((uri or LIBVIRT_URI).encode('utf-8')).hexdigest() + '.json')
+
+    def _key(self, data):
+        return json.dumps(data, sort_keys=True)
+
+    def _load(self, path):
+        try:
+          with open(path) as f:
+            entries = json.load(f)
+        except (IOError, OSError, ValueError):
+          return {}
+        return entries if isinstance(entries, dict) else {}
+
+    @contextlib.contextmanager
+    def _update(self, uri):
+        path = self._file(uri)
+        try:
+          os.makedirs(self.path)
+        except OSError as e:
+          if e.errno != errno.EEXIST:
+            raise
+        with _flocked(path + '.lock'):
+          entries = self._load(path)
+          yield entries
+          _write_atomic(path, json.dumps(entries))
+
+    def _ttl(self, cmd):
+        return self.ttl if self.ttl is not None else CACHE_TTLS.get(cmd, 0)
+
+    def get(self, uri, cmd, data):
+        """The cached result of ``cmd`` with ``data``, or None when missing or expired."""
+        ttl = self._ttl(cmd)
+        if cmd not in CACHE_TTLS or not ttl:
+          return None
+        entry = self._load(self._file(uri)).get(cmd, {}).get(self._key(data))
+        if entry is None or time.time() - entry[0] >= ttl:
+          return None
+        return entry[1]
+
+    def put(self, uri, cmd, data, result):
+        if cmd not in CACHE_TTLS:
+          return
+        now = time.time()
+        ttl = max(self._ttl(cmd), CACHE_TTLS[cmd])
+        with self._update(uri) as entries:
+          cached = entries.setdefault(cmd, {})
+          for key in [ k for k, (stored, r) in cached.items() if now - stored >= ttl ]:
+            del cached[key]
+          cached[self._key(data)] = [ now, dict((k, result.get(k)) for k in ('changed', 'content', 'success')) ]
+
+    def invalidate(self, uri, cmds):
+        if not cmds or not os.path.exists(self._file(uri)):
+          return
+        with self._update(uri) as entries:
+          for cmd in cmds:
+            entries.pop(cmd, None)
 
 class VirtUtils(object):
 
-    def __init__(self, cmd, data, debug_on=False, reteval=None, retvar=None):
+    def __init__(self, cmd, data, debug_on=False, reteval=None, retvar=None, conn=None, watcher=None, uri=None,
+                 timing=False, metrics=None):
         #print("cmd: %s, data: %s, debug_on: %s, reteval: %s, retvar: %s" % (cmd, data, debug_on, reteval, retvar))
         if not ET_FOUND:
           raise Exception('ElementTree library is required for this module')
@@ -33,30 +965,56 @@ class VirtUtils(object):
         :type reteval: ``str``
         :param retvar: Return just this key from the response.
         :type retvar: ``str``
+        :param conn: An open libvirt connection to reuse instead of opening one.
+        :type conn: ``libvirt.virConnect``
+        :param watcher: A running domain event watcher (vutilsd only).
+        :type watcher: ``DomainEventWatcher``
+        :param uri: The libvirt URI to connect to, defaults to qemu:///system.
+        :type uri: ``str``
+        :param timing: Return per-phase timings and libvirt RPC counts in the timing key.
+        :type timing: ``bool``
+        :param metrics: Record the command's latency, result and scan sizes here.
+        :type metrics: ``MetricsSink``
         """
         if not cmd:
           raise Exception('missing required variable: cmd={}'.format(cmd))
 
         self.cmd        = cmd
         self.content    = {}
-        self.conn       = None
+        self._conn      = None
         self.data       = data
         self.debug      = {}
         self.debug_on   = debug_on
+        self.metrics    = metrics
         self.result     = { 'changed': False, 'content': None, 'success': False }
         self.reteval    = reteval
         self.retvar     = retvar
+        self.seen       = {}
+        self.timer      = PhaseTimer() if timing else _NullTimer()
+        self.timing     = timing
+        self.uri        = uri or LIBVIRT_URI
+        self.watcher    = watcher
 
-        self._conn_libvirt()
+        if conn is not None:
+          self._set_conn(conn)
 
         if debug_on:
           self.result = { 'changed': False, 'content': None, 'debug': self.debug, 'success': False }
 
+    @property
+    def conn(self):
+        # opened on first use, so unknown commands never touch libvirtd
+        if self._conn is None:
+          with self.timer.phase('connect'):
+            self._conn_libvirt()
+        return self._conn
+
+    def _set_conn(self, conn):
+        self._conn = TimedProxy(conn, self.timer) if self.timing else conn
+
     def _conn_libvirt(self):
         try:
-          self.conn = libvirt.open('qemu:///system')
-          if self.conn == None:
-            raise Exception('Failed to open connection to qemu:///system')
+          self._set_conn(open_connection(self.uri, is_readonly(self.cmd, self.data)))
         except Exception as e:
           raise Exception( 'Failure: %s' % e)
 
@@ -71,16 +1029,6 @@ class VirtUtils(object):
     def _content(self):
         return self.content
 
-    def _convert(self, data):
-        if isinstance(data, basestring):
-          return str(data)
-        elif isinstance(data, collections.Mapping):
-          return dict(map(self._convert, data.iteritems()))
-        elif isinstance(data, collections.Iterable):
-          return type(data)(map(self._convert, data))
-        else:
-          return data
-
     def _debug(self, **kwargs):
         if self.debug_on:
           if kwargs:
@@ -88,47 +1036,70 @@ class VirtUtils(object):
           else:
             return self.debug
 
-    def _find_item(self, find_i, all_i):
-        found_i = None
-        if not isinstance(all_i, list):
-          raise Exception('find_item err: not given list: {}'.format(all_i))
-        for i in all_i:
-          if isinstance(i, dict):
-            if i.has_key(find_i):
-              found_i = i
-            if find_i in i.values()[0]:
-              found_i = i
-          else:
-            if find_i == i:
-              found_i = i
-        self._check_var([found_i])
-        return found_i
-
-    def _parse_xml_macs(self, name, network, xml):
-        macs = []
-        if xml is None:
-          return None
-        tree = ET.fromstring(xml)
-        for interface in tree.findall("devices/interface"):
-          if interface.find("source").get("network") == network:
-            macs.append(interface.find("mac").get("address"))
-        return { name: macs }
+    def _host_path(self, path):
+        # keep per-host state of other hypervisors apart from the local one
+        return host_path(path, self.uri)
+
+    def _scan_domains(self, func):
+        doms = self.conn.listAllDomains()
+        self.seen['domains'] = len(doms)
+        return scan_map(func, doms, self._scan_workers())
+
+    def _scan_workers(self):
+        return int(self.data.get('scan_workers') or SCAN_WORKERS)
+
+    def _volume_info(self, vol):
+        vol_type, capacity, allocation = vol.info()
+        return { 'name': vol.name(), 'key': vol.key(), 'path': vol.path(),
+                 'capacity': capacity, 'allocation': allocation }
 
     def _result(self):
-        self.result['content'] = self._content()
-        if self.debug_on:
-          self.result['debug'] = self._debug()
+        with self.timer.phase('result'):
+          self.result['content'] = self._content()
+          if self.debug_on:
+            self.result['debug'] = self._debug()
+        if self.timing:
+          self.result['timing'] = self.timer.report()
         return self.result
 
+    def _metered(self, func):
+        def observe(seconds, result):
+          # metrics are best effort, an unwritable collector must not fail the command
+          try:
+            self.metrics.observe(self.cmd, self.uri, seconds, result, self.seen)
+          except (IOError, OSError) as e:
+            self._debug(metrics_error=str(e))
+        def run():
+          t0 = time.time()
+          try:
+            result = func()
+          except Exception:
+            observe(time.time() - t0, 'error')
+            raise
+          observe(time.time() - t0, 'success' if result.get('success') else 'failed')
+          return result
+        return run
+
     # used to get objects to make cmd calls
     def cmd_call(self):
         self._debug(cmd_call=self.cmd)
+        if self.data.get('uris') and self.cmd in FANOUT_CMDS:
+          return self.fanout
+        func = self._cmd_func()
+        if self.metrics is not None and func != self.cmd_error:
+          return self._metered(func)
+        return func
+
+    def _cmd_func(self):
         return {
+          'batch'          : self.batch,
           'domain_create'  : self.domain_create,
           'domain_delete'  : self.domain_delete,
           'domain_find'    : self.domain_find,
           'domain_get'     : self.domain_get,
           'domain_state'   : self.domain_state,
+          'domain_wait'    : self.domain_wait,
+          'inventory'      : self.inventory,
           'storage_create' : self.storage_create,
           'storage_delete' : self.storage_delete,
           'storage_get'    : self.storage_get,
@@ -138,7 +1109,116 @@ class VirtUtils(object):
         self.content = 'cmd call error - unknown command'
         return self._result()
 
+    def batch(self):
+        """Run ``operations`` (``{cmd, data}`` each) in order over this connection.
+
+        The connection is read-only unless an operation writes. With
+        ``stop_on_error`` (the default) the operations after the first
+        unsuccessful one are skipped.
+        """
+        operations    = self.data.get('operations') or []
+        stop_on_error = self.data.get('stop_on_error', True)
+        results = []
+        failed  = False
+        for op in operations:
+          cmd = _batch_cmd(op)
+          rec = { 'cmd': cmd, 'success': False, 'changed': False, 'content': None }
+          results.append(rec)
+          if failed and stop_on_error:
+            rec['skipped'] = True
+            continue
+          try:
+            if cmd == 'batch':
+              raise Exception('batch operations cannot be nested')
+            sub = VirtUtils(cmd, cmd_options(cmd, op.get('data') or {}), self.debug_on, conn=self.conn, watcher=self.watcher,
+                            uri=self.uri, metrics=self.metrics)
+            res = sub.cmd_call()()
+            rec.update(success=res['success'], changed=res['changed'], content=res['content'])
+            if self.debug_on:
+              rec['debug'] = res.get('debug')
+          except Exception as e:
+            rec['error'] = str(e)
+          failed = failed or not rec['success']
+        self.content = results
+        self.result['success'] = not failed
+        self.result['changed'] = any(rec['changed'] for rec in results)
+        return self._result()
+
+    def _domain_create_bulk(self, xmlconfigs):
+        concurrency = int(self.data.get('concurrency') or SCAN_WORKERS)
+        stagger     = _Stagger(float(self.data.get('stagger') or 0))
+        results     = []
+        defined     = []
+        for xmlconfig in xmlconfigs:
+          rec = { 'name': None, 'defined': False, 'started': False,
+                  'define_time': None, 'start_time': None, 'error': None }
+          t0 = time.time()
+          try:
+            rec['name']    = ET.fromstring(xmlconfig).findtext('name')
+            dom = self.conn.defineXML(xmlconfig)
+            rec['name']    = dom.name()
+            rec['defined'] = True
+            defined.append((rec, dom))
+          except (ET.ParseError, libvirt.libvirtError) as e:
+            rec['error'] = str(e)
+          rec['define_time'] = round(time.time() - t0, 3)
+          results.append(rec)
+
+        def start(item):
+          rec, dom = item
+          try:
+            if dom.isActive():
+              return
+            stagger.wait()
+            t0 = time.time()
+            dom.create()
+            rec['start_time'] = round(time.time() - t0, 3)
+            rec['started']    = True
+          except libvirt.libvirtError as e:
+            rec['error'] = str(e)
+        scan_map(start, defined, concurrency)
+
+        self.content = results
+        self.result['success'] = all(rec['error'] is None for rec in results)
+        self.result['changed'] = len(defined) > 0
+        return self._result()
+
+    def fanout(self):
+        """Run the command against every URI in ``uris`` concurrently.
+
+        domain_find returns the first host (in ``uris`` order) that has the
+        MAC, the other commands return a uri -> content map. Hosts that
+        raised are reported under ``errors``.
+        """
+        uris  = self.data['uris']
+        data  = dict((k, v) for k, v in self.data.items() if k != 'uris')
+        token = data.get('token')
+        def run(uri):
+          host_data = dict(data)
+          if isinstance(token, dict):
+            host_data['token'] = token.get(uri)
+          try:
+            return VirtUtils(self.cmd, host_data, self.debug_on, uri=uri, timing=self.timing,
+                             metrics=self.metrics).cmd_call()()
+          except Exception as e:
+            return { 'changed': False, 'content': None, 'success': False, 'error': str(e) }
+        results = dict(zip(uris, scan_map(run, uris, int(self.data.get('fanout_workers') or len(uris)))))
+        errors  = dict((uri, r['error']) for uri, r in results.items() if 'error' in r)
+        if self.cmd == 'domain_find':
+          hits = [ { 'uri': uri, 'name': results[uri]['content'] } for uri in uris if results[uri]['success'] ]
+          self.content = hits[0] if hits else {}
+          self.result['success'] = len(hits) > 0
+        else:
+          self.content = dict((uri, r['content']) for uri, r in results.items() if r['success'])
+          self.result['success'] = len(self.content) == len(uris)
+        self.result['errors']  = errors
+        self.result['changed'] = False
+        self._debug(fanout=results)
+        return self._result()
+
     def domain_create(self):
+        if self.data.get('xmlconfigs'):
+          return self._domain_create_bulk(self.data['xmlconfigs'])
         xmlconfig = self.data['xmlconfig']
         self._check_var([xmlconfig])
         dom = self.conn.defineXML(xmlconfig)
@@ -151,33 +1231,211 @@ class VirtUtils(object):
         self.result['changed'] = True
         return self._result()
 
-    def domain_delete(self):
-        name = self.data['name']
-        self._check_var([name])
+    def _lookup_domain(self, name):
         try:
-          dom = self.conn.lookupByName(name)
-          if not dom:
-            return self._result()
-          if dom is not None:
+          return self.conn.lookupByName(name)
+        except libvirt.libvirtError as e:
+          if e.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+            return None
+          raise
+
+    def _domain_volumes(self, xml):
+        vols = []
+        for disk in ET.fromstring(xml).findall("devices/disk"):
+          source = disk.find("source")
+          if disk.get("device", "disk") != "disk" or source is None:
+            continue
+          # read-only and shareable disks are base images other domains use too
+          if disk.find("readonly") is not None or disk.find("shareable") is not None:
+            continue
+          if source.get("pool") and source.get("volume"):
+            vols.append({ 'pool': source.get("pool"), 'volume': source.get("volume") })
+          elif source.get("file") or source.get("dev"):
+            vols.append({ 'path': source.get("file") or source.get("dev") })
+        return vols
+
+    def _delete_volume(self, ref):
+        if 'path' in ref:
+          vol = self.conn.storageVolLookupByPath(ref['path'])
+        else:
+          vol = self.conn.storagePoolLookupByName(ref['pool']).storageVolLookupByName(ref['volume'])
+        key = vol.key()
+        vol.delete(0)
+        return key
+
+    def _domain_teardown(self, name, graceful, timeout, remove_volumes):
+        rec = { 'name': name, 'outcome': None, 'time': None, 'volumes': [], 'error': None }
+        t0  = time.time()
+        try:
+          dom = self._lookup_domain(name)
+          if dom is None:
+            rec['outcome'] = 'absent'
+            return rec
+          vols = self._domain_volumes(dom.XMLDesc()) if remove_volumes else []
+          rec['outcome'] = 'undefined'
+          if dom.isActive():
+            if graceful:
+              try:
+                dom.shutdown()
+                while dom.isActive() and time.time() - t0 < timeout:
+                  time.sleep(0.5)
+              except libvirt.libvirtError:
+                # paused or wedged domains refuse a shutdown, destroy them below
+                pass
             if dom.isActive():
               dom.destroy()
-            dom.undefine()
-        except:
-          pass
+              rec['outcome'] = 'destroyed'
+            else:
+              rec['outcome'] = 'shutdown'
+          dom.undefineFlags(libvirt.VIR_DOMAIN_UNDEFINE_MANAGED_SAVE |
+                            libvirt.VIR_DOMAIN_UNDEFINE_SNAPSHOTS_METADATA |
+                            getattr(libvirt, 'VIR_DOMAIN_UNDEFINE_NVRAM', 0))
+          for ref in vols:
+            rec['volumes'].append(self._delete_volume(ref))
+        except libvirt.libvirtError as e:
+          rec['error'] = str(e)
+        finally:
+          rec['time'] = round(time.time() - t0, 3)
+        return rec
+
+    def _domain_delete_bulk(self, names):
+        graceful       = self.data.get('graceful', True)
+        timeout        = float(self.data.get('timeout') or 60)
+        remove_volumes = self.data.get('remove_volumes', False)
+        concurrency    = int(self.data.get('concurrency') or SCAN_WORKERS)
+        results = scan_map(lambda name: self._domain_teardown(name, graceful, timeout, remove_volumes),
+                           names, concurrency)
+        self.content = results
+        self.result['success'] = all(rec['error'] is None for rec in results)
+        self.result['changed'] = any(rec['outcome'] not in (None, 'absent') for rec in results)
+        return self._result()
+
+    def domain_delete(self):
+        if self.data.get('names'):
+          return self._domain_delete_bulk(self.data['names'])
+        name = self.data['name']
+        self._check_var([name])
+        dom = self._lookup_domain(name)
+        if dom is not None:
+          if dom.isActive():
+            dom.destroy()
+          dom.undefine()
         self.result['success'] = True
-        self.result['changed'] = True
+        self.result['changed'] = dom is not None
         return self._result()
 
+    def _index_lookup(self, index, mac, network):
+        uuid = index.lookup(mac, network)
+        if uuid is None:
+          return None
+        try:
+          dom = self.conn.lookupByUUIDString(uuid)
+          xml = dom.XMLDesc()
+        except libvirt.libvirtError:
+          index.remove(uuid)
+          return None
+        with self.timer.phase('xml_parse'):
+          index.update(uuid, dom.name(), xml)
+        if index.lookup(mac, network) != uuid:
+          return None
+        return index.name(uuid)
+
+    def _index_refresh(self, index):
+        def fetch(dom):
+          try:
+            return (dom.UUIDString(), dom.name(), dom.XMLDesc())
+          except libvirt.libvirtError:
+            return None
+        seen = set()
+        for found in self._scan_domains(fetch):
+          if found is None:
+            continue
+          with self.timer.phase('xml_parse'):
+            index.update(*found)
+          seen.add(found[0])
+        for uuid in set(index.domains) - seen:
+          index.remove(uuid)
+
     def domain_find(self):
         mac = self.data['mac']
         network = self.data['network']
         self._check_var([mac, network])
-        macs = map(lambda x: self._parse_xml_macs(x.name(), network, x.XMLDesc()), self.conn.listAllDomains())
-        if not macs:
-          return self._result()
-        name = self._find_item(mac, macs)
+        if self.data.get('snapshot'):
+          snapshot = self._snapshot(self._snapshot_domains)
+          name     = snapshot and self._snapshot_find(snapshot, mac.lower(), network)
+          if name:
+            self.content = name
+            self.result['success'] = True
+            self.result['changed'] = False
+            return self._result()
+        if self.data.get('index', True):
+          return self._domain_find_indexed(mac, network)
+        wanted = (mac.lower(), network)
+        def match(dom):
+          xml = dom.XMLDesc()
+          with self.timer.phase('xml_parse'):
+            found = any((nic.mac, nic.network) == wanted for nic in _parse_xml_interfaces(xml))
+          return dom.name() if found else None
+        names = [ name for name in self._scan_domains(match) if name is not None ]
+        if names:
+          self.content = names[0]
+          self.result['success'] = True
+        self.result['changed'] = False
+        return self._result()
+
+    def _snapshot(self, scan, pool=None):
+        # the domains are kept in snapshot_path, each pool's vols next to it
+        path = self.data.get('snapshot_path') or SNAPSHOT_PATH
+        if pool is not None:
+          base, ext = os.path.splitext(path)
+          path = '{}-pool-{}{}'.format(base, pool, ext)
+        max_age  = self.data.get('snapshot_max_age')
+        snapshot = HostSnapshot(self._host_path(path), SNAPSHOT_MAX_AGE if max_age is None else float(max_age),
+                                self._host_path(CHANGED_PATH))
+        try:
+          return snapshot.get(scan)
+        except (IOError, OSError, libvirt.libvirtError) as e:
+          self._debug(snapshot_error=str(e))
+          return None
+
+    def _snapshot_domains(self):
+        domains = {}
+        for record, fp in self._inventory_domains():
+          domains[record['name']] = { 'uuid': record['uuid'], 'state': record['state'], 'macs': record['macs'] }
+        return { 'uri': self.uri, 'domains': domains }
+
+    def _snapshot_pool(self, pool):
+        # vol details are only fetched for the pool a storage_get asks about
+        def scan():
+          vols = self.conn.storagePoolLookupByName(pool).listAllVolumes()
+          self.seen['volumes'] = len(vols)
+          info = scan_map(self._volume_info, vols, self._scan_workers())
+          return { 'uri': self.uri, 'pool': pool, 'vols': dict((vol['name'], vol) for vol in info) }
+        return self._snapshot(scan, pool)
+
+    def _snapshot_find(self, snapshot, mac, network):
+        for name, dom in snapshot['domains'].items():
+          if mac in dom['macs'].get(network, ()):
+            return name
+        return None
+
+    def _domain_find_indexed(self, mac, network):
+        with self.timer.phase('lookup'):
+          index = MacIndex(self._host_path(self.data.get('index_path') or MAC_INDEX_PATH))
+        name  = self._index_lookup(index, mac, network)
+        if name is None:
+          self._index_refresh(index)
+          uuid = index.lookup(mac, network)
+          if uuid is not None:
+            name = index.name(uuid)
+        try:
+          with self.timer.phase('index_save'):
+            index.save()
+        except (IOError, OSError) as e:
+          self._debug(index_error=str(e))
+        self._debug(index_path=index.path, index_domains=len(index.domains))
         if name is not None:
-          self.content = name.keys()[0]
+          self.content = name
           self.result['success'] = True
         self.result['changed'] = False
         return self._result()
@@ -191,48 +1449,258 @@ class VirtUtils(object):
           if not dom:
             return self._result()
           if dom is not None:
-            macs = map(lambda x: self._parse_xml_macs(x.name(), network, x.XMLDesc()), self.conn.listAllDomains())
-            if not macs:
-              return self._result()
-            mac_t = self._find_item(name, macs)
-            mac = self._convert(mac_t)[name][0]
-            if not mac:
-              return self._result()
-            self.content = mac
+            xml = dom.XMLDesc()
+            with self.timer.phase('xml_parse'):
+              interfaces = _parse_xml_interfaces(xml)
+            if self.data.get('all_interfaces'):
+              self.content = [ { 'mac': m, 'network': n, 'model': t } for m, n, t in interfaces ]
+            else:
+              macs = [ m for m, n, t in interfaces if n == network ]
+              if not macs:
+                return self._result()
+              self.content = macs[0]
         except:
           pass
         self.result['success'] = True
         self.result['changed'] = False
         return self._result()
 
+    def _domain_states(self, names=None):
+        try:
+          stats  = self.conn.getAllDomainStats(libvirt.VIR_DOMAIN_STATS_STATE)
+          states = dict((dom.name(), DOMAIN_STATES.get(st['state.state'], 'nostate')) for dom, st in stats)
+        except (AttributeError, libvirt.libvirtError):
+          # libvirt < 1.2.8 has no bulk stats, fall back to one state() per domain
+          states = dict((dom.name(), DOMAIN_STATES.get(dom.state()[0], 'nostate')) for dom in self.conn.listAllDomains())
+        self.seen['domains'] = len(states)
+        if names is None:
+          return states
+        return dict((name, states.get(name)) for name in names)
+
     def domain_state(self):
-        state_names = { libvirt.VIR_DOMAIN_RUNNING  : "running",
-                        libvirt.VIR_DOMAIN_BLOCKED  : "blocked",
-                        libvirt.VIR_DOMAIN_PAUSED   : "paused",
-                        libvirt.VIR_DOMAIN_SHUTDOWN : "shutdown",
-                        libvirt.VIR_DOMAIN_SHUTOFF  : "shutoff",
-                        libvirt.VIR_DOMAIN_CRASHED  : "crashed",
-                        libvirt.VIR_DOMAIN_NOSTATE  : "nostate" }
-        name = self.data['name']
+        name  = self.data.get('name')
+        names = self.data.get('names')
+        if self.data.get('all') or names:
+          self.content = self._domain_states(None if self.data.get('all') else names)
+          self.result['success'] = True
+          self.result['changed'] = False
+          return self._result()
+        if not name:
+          raise Exception('missing required variable: name, names or all')
         self._check_var([name])
         try:
           dom = self.conn.lookupByName(name)
           if not dom:
             return self._result()
           if dom is not None:
-            self.content = state_names[dom.info()[0]]
+            self.content = DOMAIN_STATES[dom.info()[0]]
         except:
           pass
         self.result['success'] = True
         self.result['changed'] = False
         return self._result()
 
+    def domain_wait(self):
+        names   = self.data.get('names') or [ self.data.get('name') ]
+        target  = self.data.get('state') or 'running'
+        timeout = float(self.data.get('timeout') or 300)
+        if not all(names):
+          raise Exception('missing required variable: name or names')
+        waiter = _StateWaiter(names, target)
+        if self.watcher is not None:
+          self.watcher.add_listener(waiter.on_lifecycle)
+          try:
+            waiter.seed(self._domain_states(names))
+            self.content = waiter.wait(timeout)
+          finally:
+            self.watcher.remove_listener(waiter.on_lifecycle)
+        else:
+          # events are only delivered on connections opened after the event
+          # loop is registered, so listen on a connection of our own
+          start_event_loop()
+          events = open_connection(self.uri, readonly=True)
+          cb = events.domainEventRegisterAny(None, libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
+                                             lambda conn, dom, event, detail, opaque: waiter.on_lifecycle(dom, event, detail), None)
+          try:
+            waiter.seed(self._domain_states(names))
+            self.content = waiter.wait(timeout)
+          finally:
+            events.domainEventDeregisterAny(cb)
+            events.close()
+        self.result['success'] = all(state['reached'] for state in self.content.values())
+        self.result['changed'] = False
+        return self._result()
+
+    def _inventory_domains(self, known=None, dirty=None):
+        """Returns ``(record, xml fingerprint)`` for every domain.
+
+        Domains in ``known`` that are not in ``dirty`` reuse the MACs stored
+        with the previous generation instead of fetching their XML again.
+        """
+        flags = libvirt.VIR_DOMAIN_STATS_STATE | libvirt.VIR_DOMAIN_STATS_VCPU | libvirt.VIR_DOMAIN_STATS_BALLOON
+        known = known or {}
+        def fetch(item):
+          dom, stats = item
+          uuid = dom.UUIDString()
+          prev = known.get(uuid)
+          if prev is not None and dirty is not None and uuid not in dirty:
+            fp, macs = prev['fingerprint'], prev['macs']
+          else:
+            try:
+              xml = dom.XMLDesc()
+            except libvirt.libvirtError:
+              return None
+            with self.timer.phase('xml_parse'):
+              fp, macs = _fingerprint(xml), {}
+              for mac, network, model in _parse_xml_interfaces(xml):
+                if network is not None:
+                  macs.setdefault(network, []).append(mac)
+          return ({ 'name'   : dom.name(),
+                    'uuid'   : uuid,
+                    'state'  : DOMAIN_STATES.get(stats.get('state.state'), 'nostate'),
+                    'vcpus'  : stats.get('vcpu.current'),
+                    'memory' : stats.get('balloon.current', stats.get('balloon.maximum')),
+                    'macs'   : macs }, fp)
+        stats = self.conn.getAllDomainStats(flags)
+        self.seen['domains'] = len(stats)
+        domains = scan_map(fetch, stats, self._scan_workers())
+        return [ d for d in domains if d is not None ]
+
+    def _inventory_pools(self, names=None, details=False):
+        pools = {}
+        for pool in self.conn.listAllStoragePools(libvirt.VIR_CONNECT_LIST_STORAGE_POOLS_ACTIVE):
+          name = pool.name()
+          if names and name not in names:
+            continue
+          vols = pool.listAllVolumes()
+          if details:
+            pools[name] = scan_map(self._volume_info, vols, self._scan_workers())
+          else:
+            pools[name] = [ { 'name': v.name(), 'key': v.key() } for v in vols ]
+        self.seen['volumes'] = sum(len(v) for v in pools.values())
+        return pools
+
+    def inventory(self):
+        pools   = self.data.get('pools')
+        details = self.data.get('volume_details', False)
+        params  = [ self.uri, sorted(pools or []), bool(details) ]
+        store   = InventoryStore(self.data.get('state_dir') or INVENTORY_STATE_DIR)
+        prev    = store.load(self.data.get('token'))
+        if prev is not None and prev.get('params') != params:
+          prev = None
+
+        # take the watcher position before scanning, events that land during
+        # the scan are then picked up again by the next generation
+        dirty    = None
+        position = None
+        if self.watcher is not None:
+          position = self.watcher.position()
+          if prev is not None and prev.get('watch'):
+            dirty = self.watcher.changed_since(*prev['watch'])
+
+        domains  = self._inventory_domains(prev and prev['domains'], dirty)
+        vols     = self._inventory_pools(pools, details)
+        snapshot = { 'params': params, 'watch': position, 'domains': {}, 'volumes': {} }
+        for record, fp in domains:
+          snapshot['domains'][record['uuid']] = { 'fingerprint': fp, 'macs': record['macs'],
+                                                  'hash': _fingerprint(json.dumps(record, sort_keys=True)) }
+        for pool, pool_vols in vols.items():
+          for vol in pool_vols:
+            snapshot['volumes'][vol['key']] = _fingerprint(json.dumps([pool, vol], sort_keys=True))
+
+        if prev is None:
+          self.content = { 'full'   : True,
+                           'domains': [ record for record, fp in domains ],
+                           'pools'  : vols,
+                           'removed': { 'domains': [], 'volumes': [] } }
+        else:
+          changed = [ record for record, fp in domains
+                      if prev['domains'].get(record['uuid'], {}).get('hash') != snapshot['domains'][record['uuid']]['hash'] ]
+          changed_vols = {}
+          for pool, pool_vols in vols.items():
+            pool_vols = [ vol for vol in pool_vols if prev['volumes'].get(vol['key']) != snapshot['volumes'][vol['key']] ]
+            if pool_vols:
+              changed_vols[pool] = pool_vols
+          self.content = { 'full'   : False,
+                           'domains': changed,
+                           'pools'  : changed_vols,
+                           'removed': { 'domains': [ u for u in prev['domains'] if u not in snapshot['domains'] ],
+                                        'volumes': [ k for k in prev['volumes'] if k not in snapshot['volumes'] ] } }
+        try:
+          self.content['token'] = store.save(snapshot)
+        except (IOError, OSError) as e:
+          self.content['token'] = None
+          self._debug(token_error=str(e))
+        self.result['success'] = True
+        self.result['changed'] = False
+        return self._result()
+
+    def _clone_volume(self, pool_obj, xmlconfig):
+        clone_pool = self.data.get('clone_pool')
+        method     = self.data.get('clone_method') or 'auto'
+        src_pool   = self.conn.storagePoolLookupByName(clone_pool) if clone_pool else pool_obj
+        src        = src_pool.storageVolLookupByName(self.data['clone_from'])
+        pool_xml   = ET.fromstring(pool_obj.XMLDesc())
+        if method == 'auto' and pool_xml.get('type') == 'zfs' and src_pool.name() == pool_obj.name():
+          method = 'zfs'
+        if method == 'zfs':
+          return self._zfs_clone(pool_obj, pool_xml, src_pool, src, xmlconfig)
+        flags = 0
+        if method == 'reflink':
+          flags |= libvirt.VIR_STORAGE_VOL_CREATE_REFLINK
+        return pool_obj.createXMLFrom(xmlconfig, src, flags)
+
+    def _zfs_clone(self, pool_obj, pool_xml, src_pool, src, xmlconfig):
+        # libvirt's zfs backend cannot create a vol from another one, so
+        # clone a snapshot of the golden zvol and let libvirt pick it up
+        src_xml  = pool_xml if src_pool.name() == pool_obj.name() else ET.fromstring(src_pool.XMLDesc())
+        if pool_xml.get('type') != 'zfs' or src_xml.get('type') != 'zfs':
+          raise Exception('clone_method zfs needs zfs pools: {} and {}'.format(pool_obj.name(), src_pool.name()))
+        vol_xml  = ET.fromstring(xmlconfig)
+        name     = vol_xml.findtext('name')
+        origin   = '{}/{}'.format(src_xml.findtext('source/name'), src.name())
+        clone    = '{}/{}'.format(pool_xml.findtext('source/name'), name)
+        _run_command(['zfs', 'clone', self._clone_snapshot(origin), clone])
+        pool_obj.refresh(0)
+        vol      = pool_obj.storageVolLookupByName(name)
+        capacity = _parse_capacity(vol_xml.find('capacity'))
+        if capacity is not None and capacity > vol.info()[1]:
+          # libvirt's zfs backend cannot resize vols
+          _run_command(['zfs', 'set', 'volsize={}'.format(capacity), clone])
+          pool_obj.refresh(0)
+          vol = pool_obj.storageVolLookupByName(name)
+        return vol
+
+    def _clone_snapshot(self, origin):
+        # the newest <prefix>-* snapshot of the golden zvol with nothing written
+        # after it; once the golden zvol changes a new one is taken, clones of
+        # the older snapshots keep it alive
+        prefix = self.data.get('clone_snapshot') or 'vutils-clone'
+        out    = _run_command(['zfs', 'list', '-H', '-t', 'snapshot', '-o', 'name', '-s', 'createtxg', '-d', '1', origin])
+        snaps  = [ line for line in out.decode('utf-8').split()
+                   if line.split('@', 1)[-1] == prefix or line.split('@', 1)[-1].startswith(prefix + '-') ]
+        if snaps:
+          written = _run_command(['zfs', 'get', '-H', '-p', '-o', 'value', 'written@' + snaps[-1].split('@', 1)[1], origin])
+          if written.strip() in (b'0', b'-', b''):
+            return snaps[-1]
+        snapshot = '{}@{}-{}'.format(origin, prefix, time.strftime('%Y%m%dT%H%M%S'))
+        try:
+          _run_command(['zfs', 'snapshot', snapshot])
+        except Exception as e:
+          # a concurrent clone of the same golden zvol took it first
+          if 'dataset already exists' not in str(e):
+            raise
+        return snapshot
+
     def storage_create(self):
         pool      = self.data['pool']
         xmlconfig = self.data['xmlconfig']
         self._check_var([pool, xmlconfig])
         pool_obj  = self.conn.storagePoolLookupByName(pool)
-        vol = pool_obj.createXML(xmlconfig, 0)
+        if self.data.get('clone_from'):
+          vol = self._clone_volume(pool_obj, xmlconfig)
+        else:
+          vol = pool_obj.createXML(xmlconfig, 0)
         if not vol:
           return self._result()
         if vol is not None:
@@ -255,17 +1723,351 @@ class VirtUtils(object):
         self.result['changed'] = True
         return self._result()
 
+    def _lookup_volume(self, pool_obj, name):
+        try:
+          return pool_obj.storageVolLookupByName(name)
+        except libvirt.libvirtError as e:
+          if e.get_error_code() == libvirt.VIR_ERR_NO_STORAGE_VOL:
+            return None
+          raise
+
     def storage_get(self):
-        name = self.data['name']
-        pool = self.data['pool']
+        names = self.data.get('names')
+        pool  = self.data['pool']
+        if self.data.get('snapshot') and (names or self.data.get('name')):
+          snapshot = self._snapshot_pool(pool)
+          vols     = snapshot and snapshot['vols']
+          # anything the snapshot misses may be newer than it, ask libvirt
+          if vols and all(name in vols for name in names or [ self.data['name'] ]):
+            self.content = dict((name, vols[name]) for name in names) if names else self.data['name']
+            self.result['success'] = True
+            self.result['changed'] = False
+            return self._result()
+        if names:
+          pool_obj = self.conn.storagePoolLookupByName(pool)
+          def info(name):
+            vol = self._lookup_volume(pool_obj, name)
+            return self._volume_info(vol) if vol is not None else None
+          self.content = dict(zip(names, scan_map(info, names, self._scan_workers())))
+          self.result['success'] = True
+          self.result['changed'] = False
+          return self._result()
+        name = self.data.get('name')
+        if not name:
+          raise Exception('missing required variable: name or names')
         self._check_var([name, pool])
-        vols = self.conn.storagePoolLookupByName(pool).listVolumes()
-        if not vols:
+        pool_obj = self.conn.storagePoolLookupByName(pool)
+        vol      = self._lookup_volume(pool_obj, name)
+        if vol is None:
+          # a missing vol is a success with empty content, as it always was;
+          # only an empty pool fails
+          if pool_obj.numOfVolumes() > 0:
+            self.result['success'] = True
+            self.result['changed'] = False
           return self._result()
-        vol = self._find_item(name, vols)
-        if vol is not None:
-          self.content = vol
+        self.content = vol.name()
         self.result['success'] = True
         self.result['changed'] = False
         return self._result()
 
+
+class ConnectionPool(object):
+    """ConnectionPool.
+
+    Keeps one libvirt connection per URI and access mode open so a
+    long-running process can reuse it across commands; dead connections are
+    reopened on the next get.
+    """
+
+    def __init__(self):
+        self._conns = {}
+        self._lock  = threading.Lock()
+
+    def get(self, uri=LIBVIRT_URI, readonly=False):
+        with self._lock:
+          conn = self._conns.get((uri, readonly))
+          if conn is not None:
+            try:
+              if conn.isAlive():
+                return conn
+            except libvirt.libvirtError:
+              pass
+          conn = open_connection(uri, readonly)
+          self._conns[(uri, readonly)] = conn
+          return conn
+
+    def close(self):
+        with self._lock:
+          for conn in self._conns.values():
+            try:
+              conn.close()
+            except libvirt.libvirtError:
+              pass
+          self._conns = {}
+
+
+_event_loop = None
+
+def start_event_loop():
+    """Register libvirt's default event loop and run it on a daemon thread.
+
+    Must be called before opening the connections that events are wanted on.
+    """
+    global _event_loop
+    if _event_loop is not None:
+      return
+    libvirt.virEventRegisterDefaultImpl()
+    def run():
+      while True:
+        libvirt.virEventRunDefaultImpl()
+    _event_loop = threading.Thread(target=run, name='libvirt-events')
+    _event_loop.daemon = True
+    _event_loop.start()
+
+
+class DomainEventWatcher(object):
+    """DomainEventWatcher.
+
+    Records which domains had lifecycle or device events, tagged with a
+    sequence number. Together with the epoch (which changes whenever the
+    watcher connection is reopened) a ``(epoch, seq)`` position tells later
+    callers exactly which domains may have changed since then.
+
+    :param uri: The libvirt URI to watch.
+    :type uri: ``str``
+    """
+
+    EVENTS = ( 'VIR_DOMAIN_EVENT_ID_DEVICE_ADDED',
+               'VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED' )
+
+    def __init__(self, uri=LIBVIRT_URI):
+        self.uri    = uri
+        self.conn   = None
+        self.epoch  = None
+        self.seq    = 0
+        self.dirty  = {}
+        self._lock  = threading.Lock()
+        self._listeners = []
+
+    def start(self):
+        start_event_loop()
+        self.conn = open_connection(self.uri, readonly=True)
+        self.conn.domainEventRegisterAny(None, libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, self._on_lifecycle, None)
+        for event in self.EVENTS:
+          if hasattr(libvirt, event):
+            self.conn.domainEventRegisterAny(None, getattr(libvirt, event), self._on_event, None)
+        self.conn.registerCloseCallback(self._on_close, None)
+        with self._lock:
+          self.epoch = uuidlib.uuid4().hex
+          self.dirty = {}
+
+    def _on_event(self, conn, dom, *args):
+        with self._lock:
+          self.seq += 1
+          self.dirty[dom.UUIDString()] = self.seq
+
+    def _on_lifecycle(self, conn, dom, event, detail, opaque):
+        self._on_event(conn, dom)
+        for listener in list(self._listeners):
+          listener(dom, event, detail)
+
+    def add_listener(self, listener):
+        """Call ``listener(dom, event, detail)`` on every lifecycle event."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _on_close(self, conn, reason, opaque):
+        with self._lock:
+          self.epoch = None
+
+    def position(self):
+        if self.epoch is None:
+          try:
+            self.start()
+          except Exception:
+            return None
+        with self._lock:
+          return [ self.epoch, self.seq ]
+
+    def changed_since(self, epoch, seq):
+        """Returns the UUIDs with events after ``seq``, or ``None`` if unknown."""
+        with self._lock:
+          if epoch is None or epoch != self.epoch:
+            return None
+          return set(uuid for uuid, n in self.dirty.items() if n > seq)
+
+
+class DaemonUnavailable(Exception):
+    pass
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+          req    = json.loads(self.rfile.readline())
+          uri     = req.get('uri') or LIBVIRT_URI
+          watcher = self.server.watcher
+          if watcher is not None and watcher.uri != uri:
+            watcher = None
+          metrics = self.server.metrics
+          if metrics is None and req.get('metrics'):
+            metrics = MetricsSink(req['metrics'])
+          vutils = VirtUtils(req['cmd'], req.get('data') or {}, req.get('debug_on', False),
+                             req.get('reteval'), req.get('retvar'), conn=self.server.pool.get(uri, is_readonly(req['cmd'], req.get('data') or {})),
+                             watcher=watcher, uri=uri, timing=req.get('timing', False), metrics=metrics)
+          resp   = { 'result': vutils.cmd_call()() }
+        except Exception as e:
+          resp   = { 'error': str(e), 'exception': traceback.format_exc() }
+        self.wfile.write((json.dumps(resp) + '\n').encode('utf-8'))
+
+
+class VirtUtilsDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """VirtUtilsDaemon.
+
+    Runs VirtUtils commands received over a Unix socket against pooled
+    libvirt connections. Requests and responses are one JSON document per
+    line.
+
+    :param path: The Unix socket to listen on.
+    :type path: ``str``
+    :param watcher: A started DomainEventWatcher handed to every command.
+    :type watcher: ``DomainEventWatcher``
+    :param metrics: Record every command here instead of where the request asks.
+    :type metrics: ``MetricsSink``
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path=VUTILSD_SOCKET, watcher=None, metrics=None):
+        try:
+          os.makedirs(os.path.dirname(path))
+        except OSError as e:
+          if e.errno != errno.EEXIST:
+            raise
+        if os.path.exists(path):
+          os.unlink(path)
+        self.metrics = metrics
+        self.pool    = ConnectionPool()
+        self.watcher = watcher
+        socketserver.UnixStreamServer.__init__(self, path, _DaemonHandler)
+        os.chmod(path, 0o600)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        self.pool.close()
+        if os.path.exists(self.server_address):
+          os.unlink(self.server_address)
+
+
+class _MetricsHandler(httpserver.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+          self.send_error(404)
+          return
+        body = self.server.metrics.text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsServer(socketserver.ThreadingMixIn, httpserver.HTTPServer):
+    """Serves a MetricsSink at ``/metrics`` for Prometheus to scrape."""
+
+    daemon_threads = True
+
+    def __init__(self, address, metrics):
+        self.metrics = metrics
+        httpserver.HTTPServer.__init__(self, address, _MetricsHandler)
+
+
+class VirtUtilsClient(object):
+    """VirtUtilsClient.
+
+    Sends a command to a running VirtUtilsDaemon. Raises DaemonUnavailable
+    when nothing is listening or the daemon does not accept within
+    ``connect_timeout``, in which case the command was not run. An answer
+    that takes longer than ``read_timeout`` plus the command's own timeout
+    raises an Exception, the command may still be running.
+
+    :param path: The daemon's Unix socket.
+    :type path: ``str``
+    :param connect_timeout: Seconds to wait for the daemon to accept.
+    :type connect_timeout: ``float``
+    :param read_timeout: Seconds to wait for the answer, besides the command's timeout option.
+    :type read_timeout: ``float``
+    """
+
+    def __init__(self, path=VUTILSD_SOCKET, connect_timeout=VUTILSD_CONNECT_TIMEOUT, read_timeout=VUTILSD_READ_TIMEOUT):
+        self.path            = path
+        self.connect_timeout = connect_timeout
+        self.read_timeout    = read_timeout
+
+    def call(self, cmd, data, debug_on=False, reteval=None, retvar=None, uri=None, timing=False, metrics=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+          sock.settimeout(self.connect_timeout)
+          sock.connect(self.path)
+        except socket.error as e:
+          # socket.timeout is a socket.error
+          sock.close()
+          raise DaemonUnavailable('vutilsd not reachable at {}: {}'.format(self.path, e))
+        try:
+          sock.settimeout(self.read_timeout + _cmd_timeout(cmd, data or {}))
+          req = { 'cmd': cmd, 'data': data, 'debug_on': debug_on, 'reteval': reteval, 'retvar': retvar, 'uri': uri,
+                  'timing': timing, 'metrics': metrics }
+          sock.sendall((json.dumps(req) + '\n').encode('utf-8'))
+          buf = b''
+          while not buf.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+              break
+            buf += chunk
+        except socket.timeout:
+          raise Exception('vutilsd at {} did not answer {} in time'.format(self.path, cmd))
+        finally:
+          sock.close()
+        resp = json.loads(buf.decode('utf-8'))
+        if 'error' in resp:
+          raise Exception(resp['error'])
+        return resp['result']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='vutils daemon, serves VirtUtils commands over a Unix socket')
+    parser.add_argument('--socket', default=VUTILSD_SOCKET, help='Unix socket to listen on')
+    parser.add_argument('--no-watch', action='store_true', help='do not track domain events for incremental inventory')
+    parser.add_argument('--metrics', default=None, help='record every command in this textfile collector file')
+    parser.add_argument('--metrics-port', type=int, default=None, help='serve the metrics over HTTP at /metrics on this port')
+    args = parser.parse_args(argv)
+
+    watcher = None
+    if not args.no_watch:
+      watcher = DomainEventWatcher()
+      watcher.start()
+    metrics = None
+    if args.metrics or args.metrics_port:
+      metrics = MetricsSink(args.metrics)
+    if args.metrics_port:
+      exporter = MetricsServer(('', args.metrics_port), metrics)
+      thread   = threading.Thread(target=exporter.serve_forever, name='metrics')
+      thread.daemon = True
+      thread.start()
+    server = VirtUtilsDaemon(args.socket, watcher, metrics)
+    try:
+      server.serve_forever()
+    except KeyboardInterrupt:
+      pass
+    finally:
+      server.server_close()
+
+if __name__ == '__main__':
+    main()
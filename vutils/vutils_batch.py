@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2017, Koaps
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'curated'
+}
+
+DOCUMENTATION = '''
+---
+module: vutils_batch
+short_description: run several vutils commands in one module invocation
+extends_documentation_fragment:
+    - vutils
+    - vutils.change
+description:
+    - "Runs a list of vutils commands in order over one libvirt connection and returns a result per command"
+    - "The connection is opened read-only unless one of the commands changes something"
+version_added: "2.4"
+
+options:
+    operations:
+        description:
+            - Commands to run, each a dict with C(cmd) (for example C(storage_create) or C(vutils_storage_create)) and C(data), the options that command's module takes
+        required: true
+        type: list
+    stop_on_error:
+        default: true
+        description:
+            - Skip the remaining operations once one fails or is unsuccessful
+        required: false
+        type: bool
+
+author:
+    - Koaps
+'''
+
+EXAMPLES = '''
+- name: provision a domain in one round trip
+  vutils_batch:
+    operations:
+      - cmd: storage_create
+        data:
+          pool: zfspool
+          xmlconfig: "{{ lookup('template', 'volume.xml.j2') }}"
+      - cmd: domain_create
+        data:
+          xmlconfig: "{{ lookup('template', 'domain.xml.j2') }}"
+      - cmd: domain_state
+        data:
+          name: "{{ name }}"
+      - cmd: domain_get
+        data:
+          name: "{{ name }}"
+          network: br0_net
+'''
+
+RETURN = '''
+changed:
+    description: A flag indicating if any operation made a change
+    returned: success
+    type: boolean
+    sample: True
+content:
+    description: One result per operation, in order; skipped operations carry skipped, failed ones an error
+    returned: success
+    type: list
+    sample: [ { "cmd": "domain_state", "success": true, "changed": false, "content": "running" } ]
+success:
+    description: A flag indicating if every operation was a success
+    returned: success
+    type: boolean
+    sample: True
+'''
+
+import json
+from ansible.module_utils.basic import AnsibleModule
+
+try:
+    from ansible.modules.cloud.misc.vutils.library.vutils_cmd import VUTILS_CMD
+    VUTILS = True
+except ImportError:
+    VUTILS = False
+
+_debug = {}
+def debug(*args, **kwargs):
+    if kwargs:
+        _debug.update(kwargs)
+    else:
+        return _debug
+
+def main():
+    if not VUTILS:
+        raise Exception("vutils library not found")
+    vutils_cmd = VUTILS_CMD()
+    argspec = vutils_cmd.argspec()
+    if argspec is None:
+        raise Exception("argspec returned None")
+
+    argspec['operations']    = dict(required=True, type='list')
+    argspec['stop_on_error'] = dict(required=False, type='bool', default=True)
+
+    module = vutils_cmd.init(argspec)
+    data = dict(
+        operations    = module.params.pop('operations', []),
+        stop_on_error = module.params.pop('stop_on_error', True),
+    )
+    module.params['data'] = data
+    debug(params=module.params.copy())
+
+    result = vutils_cmd._run_cmd(module, 'batch')
+
+    if vutils_cmd.debug_on:
+        try:
+            debug(result=json.dumps(result))
+        except (TypeError, ValueError):
+            debug(result=result)
+    else:
+        if result['success']:
+            module.exit_json(**result)
+        else:
+            module.fail_json(msg=result['content'])
+
+if __name__ == '__main__':
+    main()
+    print(_debug['result'])
@@ -7,13 +7,18 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+import cProfile
+import errno
+import os
+import time
 import traceback
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils._text import to_native
 
 try:
-    from ansible.module_utils.virt_utils import VirtUtils
+    from ansible.module_utils.virt_utils import VirtUtils, VirtUtilsClient, DaemonUnavailable, MetricsSink, ResultCache, \
+                                               RESULT_CACHE_DIR, VUTILSD_SOCKET, mark_changed, stale_cmds
     VIRT_UTILS_FOUND = True
 except ImportError:
     VIRT_UTILS_FOUND = False
@@ -25,14 +30,21 @@ class VUTILS_CMD:
         if not VIRT_UTILS_FOUND:
             raise Exception("module utils virt_utils not found")
 
+        self.cache      = None
+        self.cache_ttl  = None
         self.check_mode = False
         self.cmd        = None
         self.data       = {}
         self.debug      = {}
         self.debug_on   = False
+        self.metrics    = None
+        self.profile    = None
         self.reteval    = None
         self.retvar     = None
         self.result     = { 'changed': False, 'content': None, 'success': False }
+        self.socket     = os.environ.get('VUTILS_SOCKET', VUTILSD_SOCKET)
+        self.timing     = False
+        self.uri        = None
 
     def _debug(self, **kwargs):
         if self.debug_on:
@@ -41,13 +53,76 @@ class VUTILS_CMD:
             else:
                 return self.debug
 
-    def _vutil_obj(self):
-        vutils = VirtUtils(self.cmd, self.data, self.debug_on, self.reteval, self.retvar)
+    def _result_cache(self):
+        # timed and profiled runs measure the command, so they never read the cache;
+        # fan-out results span several hosts, a change on one of them would not drop them
+        if not self.cache or self.timing or self.profile or self.data.get('uris'):
+            return None
+        return ResultCache(self.cache, self.cache_ttl)
+
+    def _invalidate(self):
+        # a change drops what it makes stale from the default cache and this
+        # task's, whether or not the task itself uses the cache, and marks
+        # the host snapshots taken before it stale
+        stale = stale_cmds(self.cmd, self.data)
+        if not stale:
+            return
+        self._cache_call(mark_changed, self.uri)
+        for path in set([RESULT_CACHE_DIR, self.cache]):
+            if path and os.path.isdir(path):
+                self._cache_call(ResultCache(path).invalidate, self.uri, stale)
+
+    def _cache_call(self, func, *args):
+        try:
+            return func(*args)
+        except (IOError, OSError) as e:
+            self._debug(cache_error=to_native(e))
+            return None
+
+    def _daemon_obj(self):
+        try:
+            return VirtUtilsClient(self.socket).call(self.cmd, self.data, self.debug_on, self.reteval, self.retvar, self.uri,
+                                                     timing=self.timing, metrics=self.metrics)
+        except DaemonUnavailable as e:
+            self._debug(daemon=to_native(e))
+            return self._local_obj()()
+
+    def _local_obj(self):
+        vutils = VirtUtils(self.cmd, self.data, self.debug_on, self.reteval, self.retvar, uri=self.uri,
+                           timing=self.timing, metrics=self.metrics and MetricsSink(self.metrics))
         vutils_obj = vutils.cmd_call()
         if vutils_obj is None:
             return {}
         return vutils_obj
 
+    def _profiled(self, req_obj):
+        # profile an in-process run, the result names the profile written
+        profiler = cProfile.Profile()
+        try:
+            result = profiler.runcall(req_obj)
+        finally:
+            path = self._dump_profile(profiler)
+        if isinstance(result, dict):
+            result['profile'] = path
+        return result
+
+    def _dump_profile(self, profiler):
+        try:
+            os.makedirs(self.profile)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        path = os.path.join(self.profile, '{}-{}-{}.prof'.format(self.cmd, time.strftime('%Y%m%dT%H%M%S'), os.getpid()))
+        profiler.dump_stats(path)
+        return path
+
+    def _vutil_obj(self):
+        # hand the command to vutilsd when it is running, else run it here;
+        # profiled runs stay here so the profile shows the work, not the socket
+        if self.socket and not self.profile and os.path.exists(self.socket):
+            return self._daemon_obj
+        return self._local_obj()
+
     def _result(self):
         if self.debug_on:
             self.result['debug'] = self._debug()
@@ -56,9 +131,17 @@ class VUTILS_CMD:
     def _run_cmd(self, module, cmd):
         try:
             req_data      = module.params
-            self.cmd      = cmd
-            self.data     = req_data.pop('data', {})
-            self.debug_on = req_data.pop('debug')
+            self.cmd       = cmd
+            self.data      = req_data.pop('data', {})
+            self.cache     = req_data.pop('cache') or os.environ.get('VUTILS_CACHE') or None
+            self.cache_ttl = req_data.pop('cache_ttl')
+            self.debug_on  = req_data.pop('debug')
+            self.metrics   = req_data.pop('metrics') or os.environ.get('VUTILS_METRICS') or None
+            # vutilsd runs in another directory, hand it an absolute path
+            self.metrics   = self.metrics and os.path.abspath(self.metrics)
+            self.profile   = req_data.pop('profile') or os.environ.get('VUTILS_PROFILE') or None
+            self.timing    = req_data.pop('timing')
+            self.uri       = req_data.pop('uri')
 
             self._debug(cmd=self.cmd)
             self._debug(data=self.data)
@@ -72,17 +155,40 @@ class VUTILS_CMD:
         except Exception as e:
             module.fail_json(msg=to_native(e), exception=traceback.format_exc())
 
+        cache = self._result_cache()
+        if cache is not None:
+            cached = self._cache_call(cache.get, self.uri, self.cmd, self.data)
+            if cached is not None:
+                self._debug(cache='hit')
+                self.result = dict(cached, cached=True)
+                return self._result()
+
         try:
-            self.result = req_obj()
+            if self.profile:
+                self.result = self._profiled(req_obj)
+            else:
+                self.result = req_obj()
             if self.result is None:
                 module.fail_json(msg='command obj returned None')
         except Exception as e:
             module.fail_json(msg=to_native(e), exception=traceback.format_exc())
+        finally:
+            # a change is dropped from the cache even when it fails part way
+            self._invalidate()
+
+        if cache is not None and self.result.get('success'):
+            self._cache_call(cache.put, self.uri, self.cmd, self.data, self.result)
         return self.result
 
     def argspec(self):
         argument_spec=dict(
-            debug = dict(type='bool', required=False, default=False),
+            cache     = dict(type='path', required=False, default=None),
+            cache_ttl = dict(type='float', required=False, default=None),
+            debug     = dict(type='bool', required=False, default=False),
+            metrics   = dict(type='path', required=False, default=None),
+            profile   = dict(type='path', required=False, default=None),
+            timing    = dict(type='bool', required=False, default=False),
+            uri       = dict(type='str', required=False, default='qemu:///system'),
         )
         return argument_spec
 
@@ -17,22 +17,37 @@ DOCUMENTATION = '''
 ---
 module: vutils_domain_create
 short_description: create KVM domain
-extends_documentation_fragment: vutils
+extends_documentation_fragment:
+    - vutils
+    - vutils.change
 description:
     - "This module is for virt utils"
 version_added: "2.4"
 
 options:
-    debug:
-        default: false
+    concurrency:
+        default: 8
         description:
-            - Turn on module debugging output
+            - With I(xmlconfigs), how many domains are started at the same time
         required: false
-        type: bool
+        type: int
     xmlconfig:
         description:
             - XML config for new domain (use template lookup for domain_xml.j2)
-        required: true
+            - One of I(xmlconfig) or I(xmlconfigs) is required
+        required: false
+    xmlconfigs:
+        description:
+            - List of XML configs, all domains are defined over one connection then started with I(concurrency) and I(stagger)
+            - Returns name, defined, started, define_time, start_time and error for every domain, a failed domain does not stop the others
+        required: false
+        type: list
+    stagger:
+        default: 0
+        description:
+            - With I(xmlconfigs), minimum seconds between two domain starts
+        required: false
+        type: float
 
 author:
     - Koaps
@@ -42,6 +57,12 @@ EXAMPLES = '''
 - name: create KVM domain
   vutils_domain_create:
     xmlconfig : "{{ xmlconfig }}"
+
+- name: create a wave of KVM domains
+  vutils_domain_create:
+    xmlconfigs  : "{{ wave | map('domain_xml') | list }}"
+    concurrency : 4
+    stagger     : 2
 '''
 
 RETURN = '''
@@ -87,11 +108,17 @@ def main():
     if argspec is None:
         raise Exception("argspec returned None")
 
-    argspec['xmlconfig'] = dict(required=True, type='str')
+    argspec['concurrency'] = dict(required=False, type='int', default=8)
+    argspec['stagger']     = dict(required=False, type='float', default=0)
+    argspec['xmlconfig']   = dict(required=False, type='str')
+    argspec['xmlconfigs']  = dict(required=False, type='list')
 
     module = vutils_cmd.init(argspec)
     data = dict(
-        xmlconfig = module.params.pop('xmlconfig', None),
+        concurrency = module.params.pop('concurrency', None),
+        stagger     = module.params.pop('stagger', None),
+        xmlconfig   = module.params.pop('xmlconfig', None),
+        xmlconfigs  = module.params.pop('xmlconfigs', None),
     )
     module.params['data'] = data
     debug(params=module.params.copy())
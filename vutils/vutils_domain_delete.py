@@ -17,22 +17,50 @@ DOCUMENTATION = '''
 ---
 module: vutils_domain_delete
 short_description: delete KVM domain
-extends_documentation_fragment: vutils
+extends_documentation_fragment:
+    - vutils
+    - vutils.change
 description:
     - "This module is for virt utils"
 version_added: "2.4"
 
 options:
-    debug:
-        default: false
+    concurrency:
+        default: 8
         description:
-            - Turn on module debugging output
+            - With I(names), how many domains are torn down at the same time
         required: false
-        type: bool
+        type: int
     name:
         description:
             - Name of domain to delete
-        required: true
+            - One of I(name) or I(names) is required
+        required: false
+    names:
+        description:
+            - List of domains to tear down in parallel
+            - Returns name, outcome (absent, undefined, shutdown or destroyed), time, removed volumes and error for every domain
+        required: false
+        type: list
+    graceful:
+        default: true
+        description:
+            - With I(names), ask running domains to shut down and only destroy them after I(timeout)
+        required: false
+        type: bool
+    remove_volumes:
+        default: false
+        description:
+            - With I(names), also delete the storage vols attached as disks
+            - Disks marked C(readonly) or C(shareable) are left alone, as other domains may use them
+        required: false
+        type: bool
+    timeout:
+        default: 60
+        description:
+            - With I(names) and I(graceful), seconds to wait for a shutdown before destroying the domain
+        required: false
+        type: float
 
 author:
     - Koaps
@@ -42,6 +70,12 @@ EXAMPLES = '''
 - name: delete KVM domain
   vutils_domain_delete:
     name : "{{ name }}"
+
+- name: tear down a test environment
+  vutils_domain_delete:
+    names          : "{{ groups['testenv'] }}"
+    remove_volumes : true
+    timeout        : 30
 '''
 
 RETURN = '''
@@ -87,11 +121,21 @@ def main():
     if argspec is None:
         raise Exception("argspec returned None")
 
-    argspec['name'] = dict(required=True, type='str')
+    argspec['concurrency']    = dict(required=False, type='int', default=8)
+    argspec['graceful']       = dict(required=False, type='bool', default=True)
+    argspec['name']           = dict(required=False, type='str')
+    argspec['names']          = dict(required=False, type='list')
+    argspec['remove_volumes'] = dict(required=False, type='bool', default=False)
+    argspec['timeout']        = dict(required=False, type='float', default=60)
 
     module = vutils_cmd.init(argspec)
     data = dict(
-        name = module.params.pop('name', None),
+        concurrency    = module.params.pop('concurrency', None),
+        graceful       = module.params.pop('graceful', True),
+        name           = module.params.pop('name', None),
+        names          = module.params.pop('names', None),
+        remove_volumes = module.params.pop('remove_volumes', False),
+        timeout        = module.params.pop('timeout', None),
     )
     module.params['data'] = data
     debug(params=module.params.copy())
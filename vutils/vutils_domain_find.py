@@ -17,18 +17,25 @@ DOCUMENTATION = '''
 ---
 module: vutils_domain_find
 short_description: find a domain by MAC
-extends_documentation_fragment: vutils
+extends_documentation_fragment:
+    - vutils
+    - vutils.query
 description:
     - "This module is for virt utils"
 version_added: "2.4"
 
 options:
-    debug:
-        default: false
+    index:
+        default: true
         description:
-            - Turn on module debugging output
+            - Use the on-host MAC index instead of parsing every domain XML on each lookup
         required: false
         type: bool
+    index_path:
+        default: /var/cache/vutils/mac_index.json
+        description:
+            - Path of the on-host MAC index file
+        required: false
     mac:
         description:
             - MAC address to find the Domain
@@ -38,6 +45,35 @@ options:
         description:
             - Name of network PXE is on
         required: false
+    scan_workers:
+        default: 8
+        description:
+            - Number of domains whose XML is fetched concurrently when the host is scanned
+        required: false
+        type: int
+    snapshot:
+        default: false
+        description:
+            - Answer from the snapshot of the domains shared by all vutils runs on the hypervisor, rescanning it once (under a lock, for all concurrent callers) when it is older than I(snapshot_max_age) or a vutils command changed the hypervisor since; a MAC missing from it is looked up as without the snapshot
+        required: false
+        type: bool
+    snapshot_max_age:
+        default: 30
+        description:
+            - Seconds the host snapshot is used for before it is rescanned
+        required: false
+        type: float
+    snapshot_path:
+        default: /var/cache/vutils/snapshot.json
+        description:
+            - Path of the on-host domain snapshot file
+        required: false
+    uris:
+        description:
+            - List of libvirt URIs to search concurrently instead of I(uri)
+            - Returns the first hypervisor (in list order) holding the MAC as C({ uri, name })
+        required: false
+        type: list
 
 author:
     - Koaps
@@ -47,6 +83,13 @@ EXAMPLES = '''
 - name: find domain
   vutils_domain_find:
     mac: "{{ mac }}"
+
+- name: find which hypervisor holds a MAC
+  vutils_domain_find:
+    mac: "{{ mac }}"
+    uris:
+      - qemu+ssh://hv01/system
+      - qemu+ssh://hv02/system
 '''
 
 RETURN = '''
@@ -92,13 +135,27 @@ def main():
     if argspec is None:
         raise Exception("argspec returned None")
 
-    argspec['mac'] = dict(required=True, type='str')
-    argspec['network'] = dict(required=False, type='str', default='br0_net')
+    argspec['index']            = dict(required=False, type='bool', default=True)
+    argspec['index_path']       = dict(required=False, type='str', default='/var/cache/vutils/mac_index.json')
+    argspec['mac']              = dict(required=True, type='str')
+    argspec['network']          = dict(required=False, type='str', default='br0_net')
+    argspec['scan_workers']     = dict(required=False, type='int', default=8)
+    argspec['snapshot']         = dict(required=False, type='bool', default=False)
+    argspec['snapshot_max_age'] = dict(required=False, type='float', default=30)
+    argspec['snapshot_path']    = dict(required=False, type='str', default='/var/cache/vutils/snapshot.json')
+    argspec['uris']             = dict(required=False, type='list')
 
     module = vutils_cmd.init(argspec)
     data = dict(
-        mac     = module.params.pop('mac', None),
-        network = module.params.pop('network', None),
+        index            = module.params.pop('index', True),
+        index_path       = module.params.pop('index_path', None),
+        mac              = module.params.pop('mac', None),
+        network          = module.params.pop('network', None),
+        scan_workers     = module.params.pop('scan_workers', None),
+        snapshot         = module.params.pop('snapshot', False),
+        snapshot_max_age = module.params.pop('snapshot_max_age', None),
+        snapshot_path    = module.params.pop('snapshot_path', None),
+        uris             = module.params.pop('uris', None),
     )
     module.params['data'] = data
     debug(params=module.params.copy())
@@ -17,16 +17,18 @@ DOCUMENTATION = '''
 ---
 module: vutils_domain_get
 short_description: get KVM domain by name
-extends_documentation_fragment: vutils
+extends_documentation_fragment:
+    - vutils
+    - vutils.query
 description:
     - "This module is for virt utils"
 version_added: "2.4"
 
 options:
-    debug:
+    all_interfaces:
         default: false
         description:
-            - Turn on module debugging output
+            - Return the MAC, network and model of every interface instead of the first MAC on I(network)
         required: false
         type: bool
     name:
@@ -38,6 +40,11 @@ options:
         description:
             - Name of network PXE is on
         required: false
+    uris:
+        description:
+            - List of libvirt URIs to query concurrently instead of I(uri), returns a uri -> content map
+        required: false
+        type: list
 
 author:
     - Koaps
@@ -48,6 +55,11 @@ EXAMPLES = '''
   vutils_domain_get:
     name: "{{ name }}"
     network: "{{ network }}"
+
+- name: get all interfaces of a domain
+  vutils_domain_get:
+    name: "{{ name }}"
+    all_interfaces: true
 '''
 
 RETURN = '''
@@ -93,13 +105,17 @@ def main():
     if argspec is None:
         raise Exception("argspec returned None")
 
-    argspec['name']    = dict(required=True, type='str')
-    argspec['network'] = dict(required=False, type='str', default='br0_net')
+    argspec['all_interfaces'] = dict(required=False, type='bool', default=False)
+    argspec['name']           = dict(required=True, type='str')
+    argspec['network']        = dict(required=False, type='str', default='br0_net')
+    argspec['uris']           = dict(required=False, type='list')
 
     module = vutils_cmd.init(argspec)
     data = dict(
-        name    = module.params.pop('name', None),
-        network = module.params.pop('network', None),
+        all_interfaces = module.params.pop('all_interfaces', False),
+        name           = module.params.pop('name', None),
+        network        = module.params.pop('network', None),
+        uris           = module.params.pop('uris', None),
     )
     module.params['data'] = data
     debug(params=module.params.copy())
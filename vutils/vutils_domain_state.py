@@ -17,22 +17,35 @@ DOCUMENTATION = '''
 ---
 module: vutils_domain_state
 short_description: get KVM domain state by name
-extends_documentation_fragment: vutils
+extends_documentation_fragment:
+    - vutils
+    - vutils.query
 description:
     - "This module is for virt utils"
 version_added: "2.4"
 
 options:
-    debug:
+    all:
         default: false
         description:
-            - Turn on module debugging output
+            - Return a name -> state map for every domain on the host
         required: false
         type: bool
     name:
         description:
             - Name of domain to get (should be short hostname)
-        required: true
+            - One of I(name), I(names) or I(all) is required
+        required: false
+    names:
+        description:
+            - List of domains to get, returns a name -> state map (state is null for unknown domains)
+        required: false
+        type: list
+    uris:
+        description:
+            - List of libvirt URIs to query concurrently instead of I(uri), returns a uri -> content map
+        required: false
+        type: list
 
 author:
     - Koaps
@@ -42,6 +55,10 @@ EXAMPLES = '''
 - name: get domain state by name
   vutils_domain_state:
     name: "{{ name }}"
+
+- name: get state of many domains at once
+  vutils_domain_state:
+    names: "{{ groups['vms'] }}"
 '''
 
 RETURN = '''
@@ -87,11 +104,17 @@ def main():
     if argspec is None:
         raise Exception("argspec returned None")
 
-    argspec['name'] = dict(required=True, type='str')
+    argspec['all']   = dict(required=False, type='bool', default=False)
+    argspec['name']  = dict(required=False, type='str')
+    argspec['names'] = dict(required=False, type='list')
+    argspec['uris']  = dict(required=False, type='list')
 
     module = vutils_cmd.init(argspec)
     data = dict(
-        name = module.params.pop('name', None),
+        all   = module.params.pop('all', False),
+        name  = module.params.pop('name', None),
+        names = module.params.pop('names', None),
+        uris  = module.params.pop('uris', None),
     )
     module.params['data'] = data
     debug(params=module.params.copy())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2017, Koaps
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'curated'
+}
+
+DOCUMENTATION = '''
+---
+module: vutils_domain_wait
+short_description: wait for KVM domains to reach a state
+extends_documentation_fragment:
+    - vutils
+    - vutils.uncached
+description:
+    - "This module is for virt utils"
+    - "Listens for libvirt lifecycle events instead of polling, returns as soon as every domain is in I(state) or I(timeout) passes"
+version_added: "2.4"
+
+options:
+    name:
+        description:
+            - Name of domain to wait for
+            - One of I(name) or I(names) is required
+        required: false
+    names:
+        description:
+            - List of domains to wait for
+        required: false
+        type: list
+    state:
+        choices: [ running, paused, shutdown, shutoff, crashed, pmsuspended, undefined ]
+        default: running
+        description:
+            - State to wait for, C(undefined) waits for the domains to go away
+        required: false
+    timeout:
+        default: 300
+        description:
+            - Seconds to wait before giving up
+        required: false
+        type: float
+
+author:
+    - Koaps
+'''
+
+EXAMPLES = '''
+- name: wait for the wave to boot
+  vutils_domain_wait:
+    names   : "{{ wave }}"
+    state   : running
+    timeout : 120
+'''
+
+RETURN = '''
+changed:
+    description: A flag indicating if any change was made or not
+    returned: success
+    type: boolean
+    sample: True
+content:
+    description: Last known state of every domain, whether it reached I(state) and after how many seconds
+    returned: success
+    type: dict
+    sample: { "vm1": { "state": "running", "reached": true, "elapsed": 4.2 } }
+success:
+    description: A flag indicating if API call was a success or not
+    returned: success
+    type: boolean
+    sample: True
+'''
+
+import json
+from ansible.module_utils.basic import AnsibleModule
+
+try:
+    from ansible.modules.cloud.misc.vutils.library.vutils_cmd import VUTILS_CMD
+    VUTILS = True
+except ImportError:
+    VUTILS = False
+
+_debug = {}
+def debug(*args, **kwargs):
+    if kwargs:
+        _debug.update(kwargs)
+    else:
+        return _debug
+
+def main():
+    if not VUTILS:
+        raise Exception("vutils library not found")
+    vutils_cmd = VUTILS_CMD()
+    argspec = vutils_cmd.argspec()
+    if argspec is None:
+        raise Exception("argspec returned None")
+
+    argspec['name']    = dict(required=False, type='str')
+    argspec['names']   = dict(required=False, type='list')
+    argspec['state']   = dict(required=False, type='str', default='running',
+                              choices=['running', 'paused', 'shutdown', 'shutoff', 'crashed', 'pmsuspended', 'undefined'])
+    argspec['timeout'] = dict(required=False, type='float', default=300)
+
+    module = vutils_cmd.init(argspec)
+    data = dict(
+        name    = module.params.pop('name', None),
+        names   = module.params.pop('names', None),
+        state   = module.params.pop('state', None),
+        timeout = module.params.pop('timeout', None),
+    )
+    module.params['data'] = data
+    debug(params=module.params.copy())
+
+    result = vutils_cmd._run_cmd(module, 'domain_wait')
+
+    if vutils_cmd.debug_on:
+        try:
+            debug(result=json.dumps(result))
+        except (TypeError, ValueError):
+            debug(result=result)
+    else:
+        if result['success']:
+            module.exit_json(**result)
+        else:
+            module.fail_json(msg=result['content'])
+
+if __name__ == '__main__':
+    main()
+    print(_debug['result'])
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2017, Koaps
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'curated'
+}
+
+DOCUMENTATION = '''
+---
+module: vutils_inventory
+short_description: get all domains and storage vols of a host in one pass
+extends_documentation_fragment:
+    - vutils
+    - vutils.uncached
+description:
+    - "This module is for virt utils"
+    - "Returns name, uuid, state, vcpus, memory (KiB) and MACs per network of every domain, and the vols of every active storage pool"
+    - "Every run returns a token; passing it back returns only what was added, changed or removed since that run"
+version_added: "2.4"
+
+options:
+    pools:
+        description:
+            - Only list vols of these storage pools (default is all active pools)
+        required: false
+        type: list
+    scan_workers:
+        default: 8
+        description:
+            - Number of domains whose XML is fetched concurrently
+        required: false
+        type: int
+    token:
+        description:
+            - Token from a previous run, only changes since that run are returned
+            - Unknown or expired tokens return the full inventory with C(full=true)
+        required: false
+    uris:
+        description:
+            - List of libvirt URIs to inventory concurrently instead of I(uri), returns a uri -> inventory map
+            - With I(uris), I(token) may be a uri -> token map
+        required: false
+        type: list
+    volume_details:
+        default: false
+        description:
+            - Also return path, capacity and allocation of every vol (one extra call per vol)
+        required: false
+        type: bool
+
+author:
+    - Koaps
+'''
+
+EXAMPLES = '''
+- name: get host inventory
+  vutils_inventory:
+    pools:
+      - zfspool
+  register: inventory
+
+- name: get changes since the last run
+  vutils_inventory:
+    pools:
+      - zfspool
+    token: "{{ inventory.content.token }}"
+'''
+
+RETURN = '''
+changed:
+    description: A flag indicating if any change was made or not
+    returned: success
+    type: boolean
+    sample: True
+content:
+    description: The domains and storage pool vols of the host
+    returned: success
+    type: dict
+    sample: { "full": true, "token": "...", "domains": [ { "name": "vm1", "uuid": "...", "state": "running", "vcpus": 2, "memory": 1048576, "macs": { "br0_net": [ "52:54:00:00:00:01" ] } } ], "pools": { "zfspool": [ { "name": "vm1", "key": "..." } ] }, "removed": { "domains": [], "volumes": [] } }
+success:
+    description: A flag indicating if API call was a success or not
+    returned: success
+    type: boolean
+    sample: True
+'''
+
+import json
+from ansible.module_utils.basic import AnsibleModule
+
+try:
+    from ansible.modules.cloud.misc.vutils.library.vutils_cmd import VUTILS_CMD
+    VUTILS = True
+except ImportError:
+    VUTILS = False
+
+_debug = {}
+def debug(*args, **kwargs):
+    if kwargs:
+        _debug.update(kwargs)
+    else:
+        return _debug
+
+def main():
+    if not VUTILS:
+        raise Exception("vutils library not found")
+    vutils_cmd = VUTILS_CMD()
+    argspec = vutils_cmd.argspec()
+    if argspec is None:
+        raise Exception("argspec returned None")
+
+    argspec['pools']          = dict(required=False, type='list')
+    argspec['scan_workers']   = dict(required=False, type='int', default=8)
+    argspec['token']          = dict(required=False, type='raw', no_log=False)
+    argspec['uris']           = dict(required=False, type='list')
+    argspec['volume_details'] = dict(required=False, type='bool', default=False)
+
+    module = vutils_cmd.init(argspec)
+    data = dict(
+        pools          = module.params.pop('pools', None),
+        scan_workers   = module.params.pop('scan_workers', None),
+        token          = module.params.pop('token', None),
+        uris           = module.params.pop('uris', None),
+        volume_details = module.params.pop('volume_details', False),
+    )
+    module.params['data'] = data
+    debug(params=module.params.copy())
+
+    result = vutils_cmd._run_cmd(module, 'inventory')
+
+    if vutils_cmd.debug_on:
+        try:
+            debug(result=json.dumps(result))
+        except (TypeError, ValueError):
+            debug(result=result)
+    else:
+        if result['success']:
+            module.exit_json(**result)
+        else:
+            module.fail_json(msg=result['content'])
+
+if __name__ == '__main__':
+    main()
+    print(_debug['result'])
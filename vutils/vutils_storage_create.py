@@ -17,18 +17,37 @@ DOCUMENTATION = '''
 ---
 module: vutils_storage_create
 short_description: create storage vol
-extends_documentation_fragment: vutils
+extends_documentation_fragment:
+    - vutils
+    - vutils.change
 description:
     - "This module is for virt utils"
 version_added: "2.4"
 
 options:
-    debug:
-        default: false
+    clone_from:
         description:
-            - Turn on module debugging output
+            - Name of a golden vol to build the new vol from instead of creating an empty one
+        required: false
+    clone_method:
+        choices: [ auto, libvirt, reflink, zfs ]
+        default: auto
+        description:
+            - How to clone I(clone_from)
+            - C(zfs) clones a snapshot of the golden zvol (copy-on-write), C(auto) picks it for zfs pools
+            - C(libvirt) copies with createXMLFrom, C(reflink) asks libvirt for a reflink copy
+        required: false
+    clone_pool:
+        description:
+            - Pool of I(clone_from) when it is not I(pool)
+        required: false
+    clone_snapshot:
+        default: vutils-clone
+        description:
+            - Prefix of the snapshots of the golden zvol that C(zfs) clones are made from
+            - Clones use the newest C(<prefix>-<timestamp>) snapshot; once the golden zvol has been written to since that snapshot, a new one is taken, so clones always start from the current golden data
+            - Older snapshots stay as long as clones of them exist
         required: false
-        type: bool
     pool:
         default: zfspool
         description:
@@ -48,6 +67,12 @@ EXAMPLES = '''
   vutils_storage_create:
     pool      : "{{ pool }}"
     xmlconfig : "{{ xmlconfig }}"
+
+- name: create storage vol from golden image
+  vutils_storage_create:
+    pool       : "{{ pool }}"
+    xmlconfig  : "{{ xmlconfig }}"
+    clone_from : golden-focal
 '''
 
 RETURN = '''
@@ -93,13 +118,21 @@ def main():
     if argspec is None:
         raise Exception("argspec returned None")
 
-    argspec['pool']      = dict(required=False, type='str', default='zfspool')
-    argspec['xmlconfig'] = dict(required=True, type='str')
+    argspec['clone_from']     = dict(required=False, type='str')
+    argspec['clone_method']   = dict(required=False, type='str', default='auto', choices=['auto', 'libvirt', 'reflink', 'zfs'])
+    argspec['clone_pool']     = dict(required=False, type='str')
+    argspec['clone_snapshot'] = dict(required=False, type='str', default='vutils-clone')
+    argspec['pool']           = dict(required=False, type='str', default='zfspool')
+    argspec['xmlconfig']      = dict(required=True, type='str')
 
     module = vutils_cmd.init(argspec)
     data = dict(
-        pool      = module.params.pop('pool', None),
-        xmlconfig = module.params.pop('xmlconfig', None),
+        clone_from     = module.params.pop('clone_from', None),
+        clone_method   = module.params.pop('clone_method', None),
+        clone_pool     = module.params.pop('clone_pool', None),
+        clone_snapshot = module.params.pop('clone_snapshot', None),
+        pool           = module.params.pop('pool', None),
+        xmlconfig      = module.params.pop('xmlconfig', None),
     )
     module.params['data'] = data
     debug(params=module.params.copy())
@@ -17,18 +17,14 @@ DOCUMENTATION = '''
 ---
 module: vutils_storage_delete
 short_description: delete storage vol
-extends_documentation_fragment: vutils
+extends_documentation_fragment:
+    - vutils
+    - vutils.change
 description:
     - "This module is for virt utils"
 version_added: "2.4"
 
 options:
-    debug:
-        default: false
-        description:
-            - Turn on module debugging output
-        required: false
-        type: bool
     pool:
         default: zfspool
         description:
@@ -17,27 +17,57 @@ DOCUMENTATION = '''
 ---
 module: vutils_storage_get
 short_description: get storage vol by name
-extends_documentation_fragment: vutils
+extends_documentation_fragment:
+    - vutils
+    - vutils.query
 description:
     - "This module is for virt utils"
 version_added: "2.4"
 
 options:
-    debug:
-        default: false
-        description:
-            - Turn on module debugging output
-        required: false
-        type: bool
     name:
         description:
             - Name of storage vol to get (should be short hostname)
-        required: true
+            - One of I(name) or I(names) is required
+        required: false
+    names:
+        description:
+            - List of storage vols to get, returns a name -> { key, path, capacity, allocation } map (null for missing vols)
+        required: false
+        type: list
     pool:
         default: zfspool
         description:
             - Pool name for storage vol
         required: false
+    scan_workers:
+        default: 8
+        description:
+            - Number of vols looked up concurrently when I(names) is given
+        required: false
+        type: int
+    snapshot:
+        default: false
+        description:
+            - Answer from the snapshot of I(pool)'s vols shared by all vutils runs on the hypervisor, rescanning it once (under a lock, for all concurrent callers) when it is older than I(snapshot_max_age) or a vutils command changed the hypervisor since; vols missing from it are looked up in libvirt
+        required: false
+        type: bool
+    snapshot_max_age:
+        default: 30
+        description:
+            - Seconds the host snapshot is used for before it is rescanned
+        required: false
+        type: float
+    snapshot_path:
+        default: /var/cache/vutils/snapshot.json
+        description:
+            - Path of the on-host domain snapshot file, the vols of each pool are kept next to it as C(<path>-pool-<pool>.json)
+        required: false
+    uris:
+        description:
+            - List of libvirt URIs to query concurrently instead of I(uri), returns a uri -> content map
+        required: false
+        type: list
 
 author:
     - Koaps
@@ -48,6 +78,11 @@ EXAMPLES = '''
   vutils_storage_get:
     name: "{{ name }}"
     pool: "{{ pool }}"
+
+- name: get details of many vols
+  vutils_storage_get:
+    names: "{{ vm_names }}"
+    pool: "{{ pool }}"
 '''
 
 RETURN = '''
@@ -57,11 +92,10 @@ changed:
     type: boolean
     sample: True
 content:
-    description: The output returned from the MAAS command
+    description: With I(name), the vol name, or an empty dict when the vol does not exist (the task only fails when the pool has no vols at all); with I(names), a dict of name to vol details, null for missing vols
     returned: success
-    sample: [ { "name": "local" } ]
-    type: list
-    sample: ['...', '...']
+    type: raw
+    sample: "vm1-disk0"
 success:
     description: A flag indicating if API call was a success or not
     returned: success
@@ -93,13 +127,25 @@ def main():
     if argspec is None:
         raise Exception("argspec returned None")
 
-    argspec['name'] = dict(required=True, type='str')
-    argspec['pool'] = dict(required=False, type='str', default='zfspool')
+    argspec['name']             = dict(required=False, type='str')
+    argspec['names']            = dict(required=False, type='list')
+    argspec['pool']             = dict(required=False, type='str', default='zfspool')
+    argspec['scan_workers']     = dict(required=False, type='int', default=8)
+    argspec['snapshot']         = dict(required=False, type='bool', default=False)
+    argspec['snapshot_max_age'] = dict(required=False, type='float', default=30)
+    argspec['snapshot_path']    = dict(required=False, type='str', default='/var/cache/vutils/snapshot.json')
+    argspec['uris']             = dict(required=False, type='list')
 
     module = vutils_cmd.init(argspec)
     data = dict(
-        name = module.params.pop('name', None),
-        pool = module.params.pop('pool', None),
+        name             = module.params.pop('name', None),
+        names            = module.params.pop('names', None),
+        pool             = module.params.pop('pool', None),
+        scan_workers     = module.params.pop('scan_workers', None),
+        snapshot         = module.params.pop('snapshot', False),
+        snapshot_max_age = module.params.pop('snapshot_max_age', None),
+        snapshot_path    = module.params.pop('snapshot_path', None),
+        uris             = module.params.pop('uris', None),
     )
     module.params['data'] = data
     debug(params=module.params.copy())